@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import re
+
+from FakeRoot import kFakeRootConfigLinksFile, kFakeRootLinksFile
+from TgConfig import TgConfig, kConfigFile
+
+kFlagConfig = '--config'
+kBuildNinjaFile = 'build.ninja'
+kFingerprintFile = '.tg/build.fingerprint'
+kNinjaFragmentsDir = '.tg/ninja'
+# Output trees of named build configurations.
+kOutDir = 'out'
+
+
+class BuildConfig:
+    # A set of flags for the whole build, defined in .tgroot:
+    #
+    #   configs = {
+    #       'debug': {'compiler_flags': ['-O0', '-UNDEBUG']},
+    #       'asan': {
+    #           'compiler_flags': ['-fsanitize=address'],
+    #           'linker_flags': ['-fsanitize=address'],
+    #       },
+    #   }
+    #
+    # The flags follow the default ones, so they may override them. A named
+    # configuration has its own manifest build-NAME.ninja and its own output
+    # tree out/NAME, which also holds its ninja logs, so switching between
+    # configurations rebuilds nothing. The default configuration has no name
+    # and builds into pkg/ and bin/.
+
+    kSettings = ('compiler_flags', 'linker_flags')
+
+    def __init__(self, name=None, compilerFlags=tuple(), linkerFlags=tuple()):
+        self.__name = name
+        self.__compilerFlags = tuple(compilerFlags)
+        self.__linkerFlags = tuple(linkerFlags)
+
+    def GetName(self):
+        return self.__name
+
+    def GetCompilerFlags(self):
+        return self.__compilerFlags
+
+    def GetLinkerFlags(self):
+        return self.__linkerFlags
+
+    def GetBuildNinja(self):
+        if self.__name is None:
+            return kBuildNinjaFile
+        return 'build-{}.ninja'.format(self.__name)
+
+    def GetBuildDir(self):
+        # Where ninja keeps .ninja_log and .ninja_deps.
+        if self.__name is None:
+            return '.'
+        return '{}/{}'.format(kOutDir, self.__name)
+
+    def GetOutDir(self):
+        # Prefix of the outputs of edges.
+        if self.__name is None:
+            return ''
+        return '{}/{}/'.format(kOutDir, self.__name)
+
+    def GetFingerprintFile(self):
+        if self.__name is None:
+            return kFingerprintFile
+        return '.tg/build-{}.fingerprint'.format(self.__name)
+
+    def GetFakeRootLinksFile(self):
+        # The fake root is shared, but each configuration lists its own links.
+        if self.__name is None:
+            return kFakeRootLinksFile
+        return kFakeRootConfigLinksFile.format(self.__name)
+
+    def GetNinjaFragmentsDir(self):
+        if self.__name is None:
+            return kNinjaFragmentsDir
+        return '{}-{}'.format(kNinjaFragmentsDir, self.__name)
+
+    def MakeNinjaCommand(self, tgPath):
+        result = ['ninja', '-C', str(tgPath)]
+        if self.__name is not None:
+            result += ['-f', self.GetBuildNinja()]
+        return result
+
+    @classmethod
+    def Load(clazz, config, name):
+        assert re.fullmatch('[A-Za-z0-9_][A-Za-z0-9_.-]*', name), (
+            '{}: Invalid configuration name.'.format(name))
+        configs = config.Get('configs', {})
+        assert isinstance(configs, dict), '{}: configs: Dict expected.'.format(
+            kConfigFile)
+        assert name in configs, '{}: {}: Unknown configuration.'.format(
+            kConfigFile, name)
+        settings = configs[name]
+        assert isinstance(settings, dict) and set(settings) <= set(
+            clazz.kSettings), '{}: configs: {}: Dict with {} expected.'.format(
+                kConfigFile, name, ', '.join(clazz.kSettings))
+        settings = TgConfig(settings)
+        return clazz(name,
+                     settings.GetStringList('compiler_flags'),
+                     settings.GetStringList('linker_flags'))
+
+
+def ParseConfigName(arg):
+    name = arg[len(kFlagConfig) + 1:]
+    assert name, '{}: Configuration name expected.'.format(arg)
+    return name
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+from BuildConfig import BuildConfig, ParseConfigName
+from TgConfig import TgConfig
+
+import pathlib
+import tempfile
+import unittest
+
+
+class TestBuildConfig(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.tmpDir.name)
+
+    def tearDown(self):
+        self.tmpDir.cleanup()
+
+    def load(self, text, name):
+        (self.root / '.tgroot').write_text(text)
+        return BuildConfig.Load(TgConfig.Load(self.root), name)
+
+    def test_Default(self):
+        buildConfig = BuildConfig()
+        self.assertIsNone(buildConfig.GetName())
+        self.assertEqual('build.ninja', buildConfig.GetBuildNinja())
+        self.assertEqual('.', buildConfig.GetBuildDir())
+        self.assertEqual('', buildConfig.GetOutDir())
+        self.assertEqual('.tg/build.fingerprint',
+                         buildConfig.GetFingerprintFile())
+        self.assertEqual('.tg/fake_root.links',
+                         buildConfig.GetFakeRootLinksFile())
+        self.assertEqual('.tg/ninja', buildConfig.GetNinjaFragmentsDir())
+        self.assertEqual(['ninja', '-C', '/tg'],
+                         buildConfig.MakeNinjaCommand(pathlib.Path('/tg')))
+
+    def test_Named(self):
+        buildConfig = BuildConfig('dbg')
+        self.assertEqual('dbg', buildConfig.GetName())
+        self.assertEqual('build-dbg.ninja', buildConfig.GetBuildNinja())
+        self.assertEqual('out/dbg', buildConfig.GetBuildDir())
+        self.assertEqual('out/dbg/', buildConfig.GetOutDir())
+        self.assertEqual('.tg/build-dbg.fingerprint',
+                         buildConfig.GetFingerprintFile())
+        self.assertEqual('.tg/fake_root-dbg.links',
+                         buildConfig.GetFakeRootLinksFile())
+        self.assertEqual('.tg/ninja-dbg', buildConfig.GetNinjaFragmentsDir())
+        self.assertEqual(['ninja', '-C', '/tg', '-f', 'build-dbg.ninja'],
+                         buildConfig.MakeNinjaCommand(pathlib.Path('/tg')))
+
+    def test_Load(self):
+        text = ("configs = {\n"
+                "    'dbg': {'compiler_flags': ['-O0']},\n"
+                "    'asan': {\n"
+                "        'compiler_flags': ['-fsanitize=address'],\n"
+                "        'linker_flags': ['-fsanitize=address'],\n"
+                "    },\n"
+                "}\n")
+        buildConfig = self.load(text, 'dbg')
+        self.assertEqual('dbg', buildConfig.GetName())
+        self.assertEqual(('-O0', ), buildConfig.GetCompilerFlags())
+        self.assertEqual(tuple(), buildConfig.GetLinkerFlags())
+        buildConfig = self.load(text, 'asan')
+        self.assertEqual(('-fsanitize=address', ),
+                         buildConfig.GetCompilerFlags())
+        self.assertEqual(('-fsanitize=address', ),
+                         buildConfig.GetLinkerFlags())
+
+    def test_LoadInvalid(self):
+        with self.assertRaises(AssertionError):
+            self.load('', 'dbg')
+        with self.assertRaises(AssertionError):
+            self.load("configs = {'dbg': {}}\n", 'missing')
+        with self.assertRaises(AssertionError):
+            self.load("configs = {'../dbg': {}}\n", '../dbg')
+        with self.assertRaises(AssertionError):
+            self.load("configs = {'dbg': {}}\n", '.dbg')
+        with self.assertRaises(AssertionError):
+            self.load("configs = ['dbg']\n", 'dbg')
+        with self.assertRaises(AssertionError):
+            self.load("configs = {'dbg': ['-O0']}\n", 'dbg')
+        with self.assertRaises(AssertionError):
+            self.load("configs = {'dbg': {'cflags': ['-O0']}}\n", 'dbg')
+        with self.assertRaises(AssertionError):
+            self.load("configs = {'dbg': {'compiler_flags': '-O0'}}\n",
+                      'dbg')
+
+    def test_ParseConfigName(self):
+        self.assertEqual('dbg', ParseConfigName('--config=dbg'))
+        with self.assertRaises(AssertionError):
+            ParseConfigName('--config=')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import collections
+import hashlib
+import os
+import pickle
+
+from PersistentTargetCache import Digest
+
+# Bump whenever the pickled layout of the fingerprint changes.
+kFormatVersion = 1
+
+InputStat = collections.namedtuple('InputStat', ['mtimeNs', 'size', 'digest'])
+
+
+def StatInput(realPath):
+    # Returns None for a missing file, which is a valid state of an input.
+    try:
+        stat = realPath.stat()
+        data = realPath.read_bytes()
+    except FileNotFoundError:
+        return None
+    return InputStat(
+        mtimeNs=stat.st_mtime_ns, size=stat.st_size, digest=Digest(data))
+
+
+class BuildFingerprint:
+    # Everything build.ninja is generated from: a header with the version of
+    # tg, the toolchain and the requested targets, and the state of the input
+    # files (TARGETS and the settings) keyed by their paths relative to
+    # TGPATH.
+
+    def __init__(self, header, inputs):
+        self.__header = tuple(header)
+        self.__inputs = dict(inputs)
+
+    def GetHeader(self):
+        return self.__header
+
+    def GetDigest(self):
+        digest = hashlib.sha1(repr(self.__header).encode('utf-8'))
+        for relPath, inputStat in sorted(self.__inputs.items()):
+            digest.update(b'\0')
+            digest.update(
+                repr((relPath, inputStat and inputStat.digest)).encode('utf-8'))
+        return digest.hexdigest()
+
+    def Revalidate(self, tgPath):
+        # Returns None if the content of any input changed. Otherwise inputs
+        # whose stat changed are updated in place and the list of their paths
+        # is returned.
+        updated = []
+        for relPath, inputStat in self.__inputs.items():
+            realPath = tgPath / relPath
+            try:
+                stat = realPath.stat()
+            except FileNotFoundError:
+                if inputStat is not None:
+                    return None
+                continue
+            if inputStat is None:
+                return None
+            if (inputStat.mtimeNs == stat.st_mtime_ns and
+                    inputStat.size == stat.st_size):
+                continue
+            newInputStat = StatInput(realPath)
+            if newInputStat is None or newInputStat.digest != inputStat.digest:
+                return None
+            updated.append((relPath, newInputStat))
+        self.__inputs.update(updated)
+        return [relPath for relPath, _ in updated]
+
+    @classmethod
+    def Load(clazz, path):
+        try:
+            with path.open('rb') as istream:
+                version, header, inputs = pickle.load(istream)
+            if version == kFormatVersion:
+                return clazz(header, inputs)
+        except Exception:
+            # A missing or corrupt fingerprint never matches.
+            pass
+        return None
+
+    def Save(self, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmpPath = path.with_name('{}.{}.tmp'.format(path.name, os.getpid()))
+        with tmpPath.open('wb') as ostream:
+            pickle.dump((kFormatVersion, self.__header, self.__inputs),
+                        ostream, pickle.HIGHEST_PROTOCOL)
+        os.replace(str(tmpPath), str(path))
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from BuildFingerprint import BuildFingerprint, StatInput
+
+import os
+import pathlib
+import tempfile
+import unittest
+
+
+class TestBuildFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.tmpDir.name)
+        (self.root / 'TARGETS').write_text('a')
+        self.fingerprint = BuildFingerprint(('header', ), {
+            'TARGETS': StatInput(self.root / 'TARGETS'),
+            'missing': StatInput(self.root / 'missing'),
+        })
+
+    def tearDown(self):
+        self.tmpDir.cleanup()
+
+    def test_Unchanged(self):
+        self.assertEqual([], self.fingerprint.Revalidate(self.root))
+
+    def test_Touched(self):
+        digest = self.fingerprint.GetDigest()
+        stat = (self.root / 'TARGETS').stat()
+        os.utime(
+            str(self.root / 'TARGETS'),
+            ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        self.assertEqual(['TARGETS'], self.fingerprint.Revalidate(self.root))
+        self.assertEqual([], self.fingerprint.Revalidate(self.root))
+        self.assertEqual(digest, self.fingerprint.GetDigest())
+
+    def test_Changed(self):
+        (self.root / 'TARGETS').write_text('bb')
+        self.assertIsNone(self.fingerprint.Revalidate(self.root))
+
+    def test_Created(self):
+        (self.root / 'missing').write_text('')
+        self.assertIsNone(self.fingerprint.Revalidate(self.root))
+
+    def test_SaveLoad(self):
+        path = self.root / '.tg' / 'build.fingerprint'
+        self.fingerprint.Save(path)
+        fingerprint = BuildFingerprint.Load(path)
+        self.assertEqual(('header', ), fingerprint.GetHeader())
+        self.assertEqual(self.fingerprint.GetDigest(), fingerprint.GetDigest())
+        path.write_bytes(b'garbage')
+        self.assertIsNone(BuildFingerprint.Load(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,7 +12,10 @@ class CCTarget(Target):
             headers=tuple(),
             compiler_flags=tuple(),
             transitive_compiler_flags=tuple(),
-            linker_flags=tuple(), ):
+            linker_flags=tuple(),
+            precompiled_header=None,
+            unity_build=True,
+            heavy_compile=False, ):
         super().__init__(srcFs, path, name, deps)
         normalizedSrcs = set()
         for src in srcs:
@@ -44,6 +47,23 @@ class CCTarget(Target):
                 linkerFlag, str), '{}:{}: {}: Invalid linker flag.'.format(
                     path, name, linkerFlag)
         self.__linkerFlags = tuple(sorted(set(linker_flags)))
+        if precompiled_header is not None:
+            assert precompiled_header and srcFs.IsRelativePath(
+                precompiled_header
+            ), '{}:{}: {}: Invalid precompiled header.'.format(
+                path, name, precompiled_header)
+            precompiled_header = srcFs.CombinePaths(path, precompiled_header)
+        self.__precompiledHeader = precompiled_header
+        assert isinstance(
+            unity_build,
+            bool), '{}:{}: {}: Invalid unity_build.'.format(
+                path, name, unity_build)
+        self.__unityBuild = unity_build
+        assert isinstance(
+            heavy_compile,
+            bool), '{}:{}: {}: Invalid heavy_compile.'.format(
+                path, name, heavy_compile)
+        self.__heavyCompile = heavy_compile
 
     def GetSrcs(self):
         return self.__srcs
@@ -60,6 +80,15 @@ class CCTarget(Target):
     def GetTransitiveCompilerFlags(self):
         return self.__transitiveCompilerFlags
 
+    def GetPrecompiledHeader(self):
+        return self.__precompiledHeader
+
+    def GetUnityBuild(self):
+        return self.__unityBuild
+
+    def GetHeavyCompile(self):
+        return self.__heavyCompile
+
     def __repr__(self):
         return self.__str__()
 
@@ -97,6 +126,14 @@ class CCTarget(Target):
             for linkerFlag in linkerFlags:
                 result += "    {},\n".format(repr(linkerFlag))
             result += "  ],\n"
+        precompiledHeader = self.GetPrecompiledHeader()
+        if precompiledHeader:
+            result += "  precompiled_header = {},\n".format(
+                repr(precompiledHeader))
+        if not self.GetUnityBuild():
+            result += "  unity_build = False,\n"
+        if self.GetHeavyCompile():
+            result += "  heavy_compile = True,\n"
         deps = self.GetDeps()
         if deps:
             result += "  deps = [\n"
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+# Content-addressed cache of compiled objects. Ninja runs compilers through
+# `tg compile-cache <cache dir> -- <compiler command>`, which looks up the
+# object and the depfile of the command by the hash of:
+#
+#  * the identity of the compiler (its real path, size and mtime),
+#  * the arguments of the command,
+#  * the output of the preprocessor.
+#
+# The arguments are relative to TGPATH and the paths in debug info are
+# remapped, so several TGPATHs on one host can share the cache directory.
+# Entries are touched on every hit, and the least recently used ones are
+# removed once the directory grows over its size limit.
+#
+# Every invocation appends a byte to kCompileCacheStatsFile, so that tg build
+# can report hits and misses of the last build.
+
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+
+kCompileCacheStatsFile = '.tg/compile_cache.stats'
+kDefaultCompileCacheSize = 5 * 1024**3
+# Bump whenever the keys or the layout of the cache directory change.
+kFormatVersion = 1
+
+_kHit = b'h'
+_kMiss = b'm'
+
+
+def ExpandUser(path, environ):
+    # Same as os.path.expanduser(), but takes HOME from the given environment,
+    # which may belong to a client of tg server.
+    if (path == '~' or path.startswith('~/')) and environ.get('HOME'):
+        return environ['HOME'] + path[1:]
+    return os.path.expanduser(path)
+
+
+def DefaultCompileCacheDir(environ):
+    return os.path.join(
+        environ.get('XDG_CACHE_HOME', ExpandUser('~/.cache', environ)), 'tg')
+
+
+def _ParseCommand(command):
+    # Returns the command of the preprocessor, the object and the depfile.
+    preprocessCommand = []
+    outPath = None
+    depPath = None
+    i = 0
+    while i < len(command):
+        arg = command[i]
+        if arg in ('-o', '-MT', '-MF') and i + 1 < len(command):
+            if arg == '-o':
+                outPath = command[i + 1]
+            elif arg == '-MF':
+                depPath = command[i + 1]
+            i += 2
+            continue
+        if arg not in ('-c', '-MMD'):
+            preprocessCommand.append(arg)
+        i += 1
+    # With -g the preprocessor records the working directory, which differs
+    # between TGPATHs.
+    return preprocessCommand + ['-E', '-fno-working-directory'
+                                ], outPath, depPath
+
+
+def _MakeKey(command, preprocessed):
+    compilerPath = os.path.realpath(shutil.which(command[0]) or command[0])
+    stat = os.stat(compilerPath)
+    digest = hashlib.sha256(
+        repr((kFormatVersion, compilerPath, stat.st_size, stat.st_mtime_ns,
+              command)).encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(preprocessed)
+    return digest.hexdigest()
+
+
+def _CopyAtomically(srcPath, dstPath):
+    tmpPath = '{}.{}.tmp'.format(dstPath, os.getpid())
+    shutil.copyfile(srcPath, tmpPath)
+    os.replace(tmpPath, dstPath)
+
+
+def _RecordStat(tgPath, kind):
+    # Appends of a single byte are atomic, so parallel compilers do not need
+    # to synchronize.
+    statsPath = tgPath / kCompileCacheStatsFile
+    fd = os.open(str(statsPath), os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                 0o644)
+    try:
+        os.write(fd, kind)
+    finally:
+        os.close(fd)
+
+
+def RunCompileCache(tgPath, cacheDir, command):
+    preprocessCommand, outPath, depPath = _ParseCommand(command)
+    # Debug info refers to the compilation directory.
+    compileCommand = command + ['-fdebug-prefix-map={}=.'.format(os.getcwd())]
+    if outPath is None:
+        return subprocess.call(compileCommand)
+    preprocess = subprocess.run(
+        preprocessCommand, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    if preprocess.returncode != 0:
+        # Let the compiler report the error.
+        return subprocess.call(compileCommand)
+    key = _MakeKey(command, preprocess.stdout)
+    entryPath = os.path.join(cacheDir, key[:2], key)
+    try:
+        _CopyAtomically(entryPath + '.o', outPath)
+        if depPath is not None:
+            _CopyAtomically(entryPath + '.d', depPath)
+        os.utime(entryPath + '.o')
+        _RecordStat(tgPath, _kHit)
+        return 0
+    except FileNotFoundError:
+        pass
+    _RecordStat(tgPath, _kMiss)
+    exitCode = subprocess.call(compileCommand)
+    if exitCode == 0:
+        os.makedirs(os.path.dirname(entryPath), exist_ok=True)
+        # The object is stored last, since its presence marks the entry
+        # complete.
+        if depPath is not None:
+            _CopyAtomically(depPath, entryPath + '.d')
+        _CopyAtomically(outPath, entryPath + '.o')
+    return exitCode
+
+
+def ResetCompileCacheStats(tgPath):
+    statsPath = tgPath / kCompileCacheStatsFile
+    statsPath.parent.mkdir(parents=True, exist_ok=True)
+    if statsPath.exists():
+        statsPath.unlink()
+
+
+def ReadCompileCacheStats(tgPath):
+    # Returns hits and misses since the last reset.
+    try:
+        stats = (tgPath / kCompileCacheStatsFile).read_bytes()
+    except FileNotFoundError:
+        return 0, 0
+    return stats.count(_kHit), stats.count(_kMiss)
+
+
+def TrimCompileCache(cacheDir, maxSize):
+    # Removes the least recently used entries until the cache fits maxSize.
+    entries = []
+    totalSize = 0
+    for dirEntry in os.scandir(cacheDir) if os.path.isdir(cacheDir) else []:
+        if not dirEntry.is_dir():
+            continue
+        for fileEntry in os.scandir(dirEntry.path):
+            stat = fileEntry.stat()
+            totalSize += stat.st_size
+            if fileEntry.name.endswith('.o'):
+                entries.append((stat.st_mtime_ns, fileEntry.path[:-2]))
+    entries.sort()
+    for _, entryPath in entries:
+        if totalSize <= maxSize:
+            break
+        for path in [entryPath + '.o', entryPath + '.d']:
+            try:
+                totalSize -= os.stat(path).st_size
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+def HandleTgCompileCache(tgPath, args):
+    assert len(args) >= 3 and args[1] == '--', (
+        'tg compile-cache: <cache dir> -- <compiler command> is expected.')
+    sys.exit(RunCompileCache(tgPath, args[0], args[2:]))
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from CompileCache import (DefaultCompileCacheDir, ExpandUser,
+                          ReadCompileCacheStats, ResetCompileCacheStats,
+                          RunCompileCache, TrimCompileCache)
+
+import os
+import pathlib
+import sys
+import tempfile
+import unittest
+
+# Preprocesses by printing the input; compiles by copying the input to the
+# output, writing a depfile and counting the compilations.
+kFakeCompiler = '''
+import sys
+args = sys.argv[1:]
+src = [arg for arg in args if arg.endswith('.c')][0]
+text = open(src).read()
+if '-E' in args:
+    sys.stdout.write(text)
+else:
+    open(args[args.index('-o') + 1], 'w').write(text)
+    open(args[args.index('-MF') + 1], 'w').write('deps')
+    open('compilations', 'a').write('x')
+'''
+
+
+class TestCompileCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.tmpDir.name)
+        self.cacheDir = str(self.root / 'cache')
+        (self.root / 'cc.py').write_text(kFakeCompiler)
+        (self.root / 'a.c').write_text('a')
+        self.cwd = os.getcwd()
+        os.chdir(str(self.root))
+        ResetCompileCacheStats(self.root)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmpDir.cleanup()
+
+    def Compile(self):
+        return RunCompileCache(self.root, self.cacheDir, [
+            sys.executable, 'cc.py', '-MMD', '-MT', 'a.o', '-MF', 'a.o.d',
+            '-c', 'a.c', '-o', 'a.o'
+        ])
+
+    def test_HitAndMiss(self):
+        self.assertEqual(0, self.Compile())
+        self.assertEqual(0, self.Compile())
+        self.assertEqual((1, 1), ReadCompileCacheStats(self.root))
+        self.assertEqual('x', (self.root / 'compilations').read_text())
+        self.assertEqual('a', (self.root / 'a.o').read_text())
+        self.assertEqual('deps', (self.root / 'a.o.d').read_text())
+        (self.root / 'a.c').write_text('b')
+        self.assertEqual(0, self.Compile())
+        self.assertEqual((1, 2), ReadCompileCacheStats(self.root))
+        self.assertEqual('b', (self.root / 'a.o').read_text())
+
+    def test_Trim(self):
+        self.Compile()
+        TrimCompileCache(self.cacheDir, 1024)
+        self.Compile()
+        self.assertEqual((1, 1), ReadCompileCacheStats(self.root))
+        TrimCompileCache(self.cacheDir, 0)
+        self.Compile()
+        self.assertEqual((1, 2), ReadCompileCacheStats(self.root))
+
+
+class TestCompileCacheDir(unittest.TestCase):
+    def test_ExpandUser(self):
+        environ = {'HOME': '/client'}
+        self.assertEqual(ExpandUser('~', environ), '/client')
+        self.assertEqual(ExpandUser('~/cache', environ), '/client/cache')
+        self.assertEqual(ExpandUser('/cache', environ), '/cache')
+
+    def test_DefaultCompileCacheDir(self):
+        self.assertEqual(
+            DefaultCompileCacheDir({
+                'HOME': '/client'
+            }), '/client/.cache/tg')
+        self.assertEqual(
+            DefaultCompileCacheDir({
+                'HOME': '/client',
+                'XDG_CACHE_HOME': '/xdg'
+            }), '/xdg/tg')
+
+
+if __name__ == '__main__':
+    unittest.main()
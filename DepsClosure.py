@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+
+class DepsClosure:
+    # Transitive properties of the targets of a plan.
+    #
+    # Targets get integer ids in plan order, so every dependency has a smaller
+    # id than its dependents. Flag unions are computed once per target from
+    # the unions of its direct dependencies and interned, so targets with the
+    # same inherited flags share a single tuple. Link order is computed on
+    # demand and costs proportionally to the size of the closure.
+
+    def __init__(self, targetPlan):
+        self.__ids = dict()
+        self.__targets = []
+        self.__deps = []
+        self.__compilerFlags = []
+        self.__linkerFlags = []
+        self.__exportedCompilerFlags = []
+        self.__interned = dict()
+        for targetRef, target in targetPlan.items():
+            deps = tuple(self.__ids[depRef] for depRef in target.GetDeps())
+            inheritedCompilerFlags = self._Union(
+                self.__exportedCompilerFlags[dep] for dep in deps)
+            inheritedLinkerFlags = self._Union(
+                self.__linkerFlags[dep] for dep in deps)
+            self.__ids[targetRef] = len(self.__targets)
+            self.__targets.append(target)
+            self.__deps.append(deps)
+            self.__exportedCompilerFlags.append(
+                self._Union((inheritedCompilerFlags,
+                             target.GetTransitiveCompilerFlags())))
+            self.__compilerFlags.append(
+                self._Union((self.__exportedCompilerFlags[-1],
+                             target.GetCompilerFlags())))
+            self.__linkerFlags.append(
+                self._Union((inheritedLinkerFlags, target.GetLinkerFlags())))
+
+    def _Union(self, flagSets):
+        result = ()
+        merged = None
+        for flagSet in flagSets:
+            if not flagSet or flagSet is result:
+                continue
+            if not result:
+                result = flagSet
+                continue
+            if merged is None:
+                merged = set(result)
+            merged.update(flagSet)
+        if merged is not None:
+            result = tuple(sorted(merged))
+        return self.__interned.setdefault(result, result)
+
+    def GetCompilerFlags(self, targetRef):
+        # Own compiler flags and the transitive compiler flags of the target
+        # and all its dependencies.
+        return self.__compilerFlags[self.__ids[targetRef]]
+
+    def GetLinkerFlags(self, targetRef):
+        # Linker flags of the target and all its dependencies.
+        return self.__linkerFlags[self.__ids[targetRef]]
+
+    def GetTransitiveDeps(self, targetRef):
+        # All dependencies of the target, each one preceding its own
+        # dependencies, which is a valid order for the linker.
+        visited = set()
+        stack = list(self.__deps[self.__ids[targetRef]])
+        while stack:
+            dep = stack.pop()
+            if dep not in visited:
+                visited.add(dep)
+                stack.extend(self.__deps[dep])
+        return [self.__targets[dep] for dep in sorted(visited, reverse=True)]
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Compares DepsClosure with the list based transitive dependency computation
+# it replaced on a synthetic graph:
+#
+#   ./DepsClosureBench.py [--targets=50000] [--legacy-targets=1000,2000,4000]
+
+import argparse
+import collections
+import pathlib
+import random
+import tempfile
+import time
+
+import CCTargets
+from DepsClosure import DepsClosure
+from SrcFs import SrcFs
+
+
+def MakeSyntheticPlan(srcFs, targetCount, fanOut, window, seed=0):
+    rng = random.Random(seed)
+    result = collections.OrderedDict()
+    targetRefs = []
+    binaryCount = max(1, targetCount // 1000)
+    for i in range(targetCount):
+        path = '//p{}'.format(i // 10)
+        candidates = targetRefs[max(0, len(targetRefs) - window):]
+        deps = rng.sample(candidates, min(fanOut, len(candidates)))
+        if i < targetCount - binaryCount:
+            clazz = CCTargets.CCLibrary
+        else:
+            clazz = CCTargets.CCBinary
+        target = clazz(
+            srcFs,
+            path,
+            't{}'.format(i % 10),
+            deps=[str(dep) for dep in deps],
+            srcs=['t{}.cc'.format(i % 10)],
+            transitive_compiler_flags=['-DT{}'.format(i)]
+            if i % 1000 == 0 else [],
+            linker_flags=['-lt{}'.format(i)] if i % 5000 == 0 else [])
+        result[target.GetTargetRef()] = target
+        if clazz is CCTargets.CCLibrary:
+            targetRefs.append(target.GetTargetRef())
+    return result
+
+
+def RunLegacy(targetPlan):
+    transitiveDepsDict = dict()
+    for target in targetPlan.values():
+        transitiveDeps = []
+        for depRef in target.GetDeps():
+            transitiveDeps.append(targetPlan[depRef])
+            transitiveDeps.extend(transitiveDepsDict[depRef])
+        visited = set()
+        tmp = []
+        for dep in reversed(transitiveDeps):
+            if dep.GetTargetRef() not in visited:
+                visited.add(dep.GetTargetRef())
+                tmp.append(dep)
+        transitiveDepsDict[target.GetTargetRef()] = list(reversed(tmp))
+    for targetRef, target in targetPlan.items():
+        transitiveDeps = transitiveDepsDict[targetRef]
+        tmp = set(target.GetCompilerFlags())
+        tmp.update(target.GetTransitiveCompilerFlags())
+        for dep in transitiveDeps:
+            tmp.update(dep.GetTransitiveCompilerFlags())
+        ' '.join(sorted(tmp))
+        if isinstance(target, CCTargets.CCBinary):
+            tmp = set(target.GetLinkerFlags())
+            for dep in transitiveDeps:
+                tmp.update(dep.GetLinkerFlags())
+            ' '.join(sorted(tmp))
+            [dep for dep in transitiveDeps if dep.GetSrcs()]
+
+
+def RunDepsClosure(targetPlan):
+    depsClosure = DepsClosure(targetPlan)
+    for targetRef, target in targetPlan.items():
+        ' '.join(depsClosure.GetCompilerFlags(targetRef))
+        if isinstance(target, CCTargets.CCBinary):
+            ' '.join(depsClosure.GetLinkerFlags(targetRef))
+            [
+                dep for dep in depsClosure.GetTransitiveDeps(targetRef)
+                if dep.GetSrcs()
+            ]
+
+
+def Measure(fn, *args):
+    startTime = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - startTime
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--targets', type=int, default=50000)
+    parser.add_argument('--legacy-targets', default='1000,2000,4000')
+    parser.add_argument('--fan-out', type=int, default=3)
+    parser.add_argument('--window', type=int, default=1000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmpDir:
+        srcFs = SrcFs(pathlib.Path(tmpDir))
+        print('{:>8} {:>12} {:>12}'.format('targets', 'legacy, s',
+                                           'closure, s'))
+        for targetCount in [
+                int(count) for count in args.legacy_targets.split(',') if count
+        ]:
+            targetPlan = MakeSyntheticPlan(srcFs, targetCount, args.fan_out,
+                                           args.window)
+            print('{:>8} {:>12.3f} {:>12.3f}'.format(
+                targetCount,
+                Measure(RunLegacy, targetPlan),
+                Measure(RunDepsClosure, targetPlan)))
+        targetPlan = MakeSyntheticPlan(srcFs, args.targets, args.fan_out,
+                                       args.window)
+        print('{:>8} {:>12} {:>12.3f}'.format(
+            args.targets, '-', Measure(RunDepsClosure, targetPlan)))
+
+
+if __name__ == '__main__':
+    main()
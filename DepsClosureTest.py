@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import DepsClosureBench
+from DepsClosure import DepsClosure
+
+import pathlib
+import tempfile
+import unittest
+
+
+class TestDepsClosure(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.targetPlan = DepsClosureBench.MakeSyntheticPlan(
+            DepsClosureBench.SrcFs(pathlib.Path(self.tmpDir.name)),
+            targetCount=300,
+            fanOut=3,
+            window=50)
+
+    def tearDown(self):
+        self.tmpDir.cleanup()
+
+    def listTransitiveDeps(self, targetRef):
+        result = set()
+        stack = list(self.targetPlan[targetRef].GetDeps())
+        while stack:
+            depRef = stack.pop()
+            if depRef not in result:
+                result.add(depRef)
+                stack.extend(self.targetPlan[depRef].GetDeps())
+        return result
+
+    def test_Flags(self):
+        depsClosure = DepsClosure(self.targetPlan)
+        for targetRef, target in self.targetPlan.items():
+            compilerFlags = set(target.GetCompilerFlags())
+            compilerFlags.update(target.GetTransitiveCompilerFlags())
+            linkerFlags = set(target.GetLinkerFlags())
+            for depRef in self.listTransitiveDeps(targetRef):
+                compilerFlags.update(
+                    self.targetPlan[depRef].GetTransitiveCompilerFlags())
+                linkerFlags.update(self.targetPlan[depRef].GetLinkerFlags())
+            self.assertEqual(
+                tuple(sorted(compilerFlags)),
+                depsClosure.GetCompilerFlags(targetRef))
+            self.assertEqual(
+                tuple(sorted(linkerFlags)),
+                depsClosure.GetLinkerFlags(targetRef))
+
+    def test_LinkOrder(self):
+        depsClosure = DepsClosure(self.targetPlan)
+        for targetRef in self.targetPlan:
+            deps = [
+                dep.GetTargetRef()
+                for dep in depsClosure.GetTransitiveDeps(targetRef)
+            ]
+            self.assertEqual(self.listTransitiveDeps(targetRef), set(deps))
+            positions = {depRef: i for i, depRef in enumerate(deps)}
+            for depRef in deps:
+                for depDepRef in self.targetPlan[depRef].GetDeps():
+                    self.assertLess(positions[depRef], positions[depDepRef])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+import os
+import pathlib
+
+# The fake root is the tree of symlinks under TGPATH/pkg that exposes the
+# sources and headers of the planned targets, so that they can be included
+# by their absolute paths.
+#
+# Generation of build.ninja writes the desired links to kFakeRootLinksFile,
+# and ninja runs a single sync edge producing kFakeRootStamp whenever the
+# file changes. Each named configuration has its own links file, and the
+# fake root is shared by all of them, so the sync takes the union of the
+# links files. It compares the desired links with the tree and with the
+# links it has created before (kFakeRootSyncedFile), and creates, updates or
+# removes only the links that differ. The stamp lives in the tree it stands
+# for, so removing the tree triggers a sync.
+kFakeRootStamp = 'pkg/.fake_root'
+kFakeRootLinksFile = '.tg/fake_root.links'
+kFakeRootConfigLinksFile = '.tg/fake_root-{}.links'
+kFakeRootSyncedFile = '.tg/fake_root.synced'
+
+
+def FormatLinks(links):
+    return ''.join('{}\t{}\n'.format(path, value)
+                   for path, value in sorted(links.items()))
+
+
+def ReadLinks(realPath):
+    # A missing file is equivalent to an empty one.
+    try:
+        text = realPath.read_text(encoding='utf-8')
+    except FileNotFoundError:
+        return dict()
+    return dict(line.split('\t', 1) for line in text.splitlines())
+
+
+def WriteLinks(realPath, links):
+    # The file is rewritten only if the links changed, so that ninja resyncs
+    # the fake root only when there is something to do.
+    text = FormatLinks(links)
+    try:
+        if realPath.read_text(encoding='utf-8') == text:
+            return False
+    except FileNotFoundError:
+        pass
+    realPath.parent.mkdir(parents=True, exist_ok=True)
+    tmpPath = realPath.with_name('{}.{}.tmp'.format(realPath.name,
+                                                   os.getpid()))
+    tmpPath.write_text(text, encoding='utf-8')
+    os.replace(str(tmpPath), str(realPath))
+    return True
+
+
+def _RemoveLink(tgPath, path):
+    realPath = tgPath / path
+    if not realPath.is_symlink():
+        return
+    realPath.unlink()
+    # Remove the directories that became empty.
+    for parent in realPath.relative_to(tgPath).parents:
+        if len(parent.parts) < 2:
+            break
+        try:
+            os.rmdir(str(tgPath / parent))
+        except OSError:
+            break
+
+
+def ReadAllLinks(tgPath):
+    result = ReadLinks(tgPath / kFakeRootLinksFile)
+    for realPath in sorted((tgPath / kFakeRootConfigLinksFile).parent.glob(
+            pathlib.PurePath(kFakeRootConfigLinksFile.format('*')).name)):
+        result.update(ReadLinks(realPath))
+    return result
+
+
+def SyncFakeRoot(tgPath):
+    links = ReadAllLinks(tgPath)
+    synced = ReadLinks(tgPath / kFakeRootSyncedFile)
+    for path in sorted(set(synced) - set(links), reverse=True):
+        _RemoveLink(tgPath, path)
+    dirs = set()
+    for path, value in sorted(links.items()):
+        realPath = tgPath / path
+        try:
+            if os.readlink(str(realPath)) == value:
+                continue
+        except FileNotFoundError:
+            pass
+        except OSError:
+            assert not realPath.is_dir(), (
+                '{}: Unable to replace a directory with a symlink.'.format(
+                    realPath))
+        if realPath.parent not in dirs:
+            realPath.parent.mkdir(parents=True, exist_ok=True)
+            dirs.add(realPath.parent)
+        # Same as `ln -snf`: the link is replaced atomically.
+        tmpPath = realPath.with_name('{}.{}.tmp'.format(
+            realPath.name, os.getpid()))
+        os.symlink(value, str(tmpPath))
+        os.replace(str(tmpPath), str(realPath))
+    WriteLinks(tgPath / kFakeRootSyncedFile, links)
+    (tgPath / kFakeRootStamp).parent.mkdir(parents=True, exist_ok=True)
+    (tgPath / kFakeRootStamp).touch()
+
+
+def RemoveFakeRoot(tgPath):
+    synced = ReadLinks(tgPath / kFakeRootSyncedFile)
+    for path in sorted(synced, reverse=True):
+        _RemoveLink(tgPath, path)
+    for path in [kFakeRootSyncedFile, kFakeRootStamp]:
+        if (tgPath / path).exists():
+            (tgPath / path).unlink()
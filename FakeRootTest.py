@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from FakeRoot import (RemoveFakeRoot, SyncFakeRoot, WriteLinks,
+                      kFakeRootConfigLinksFile, kFakeRootLinksFile,
+                      kFakeRootStamp)
+
+import os
+import pathlib
+import tempfile
+import unittest
+
+
+class TestFakeRoot(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.tmpDir.name)
+        (self.root / 'src/a').mkdir(parents=True)
+        (self.root / 'src/a/x.h').write_text('')
+        (self.root / 'src/a/y.h').write_text('')
+
+    def tearDown(self):
+        self.tmpDir.cleanup()
+
+    def Sync(self, links):
+        WriteLinks(self.root / kFakeRootLinksFile, links)
+        SyncFakeRoot(self.root)
+
+    def ListLinks(self):
+        result = dict()
+        for dirPath, dirNames, fileNames in os.walk(str(self.root / 'pkg')):
+            for name in dirNames + fileNames:
+                path = pathlib.Path(dirPath) / name
+                if path.is_symlink():
+                    result[str(path.relative_to(self.root))] = os.readlink(
+                        str(path))
+        return result
+
+    def test_Sync(self):
+        links = {
+            'pkg/a/@': '..',
+            'pkg/a/x.h': '../../src/a/x.h',
+        }
+        self.Sync(links)
+        self.assertEqual(links, self.ListLinks())
+        self.assertTrue((self.root / kFakeRootStamp).exists())
+
+        links = {
+            'pkg/a/x.h': '../../src/a/y.h',
+            'pkg/b/c/y.h': '../../../src/a/y.h',
+        }
+        self.Sync(links)
+        self.assertEqual(links, self.ListLinks())
+
+        self.Sync({})
+        self.assertEqual({}, self.ListLinks())
+        self.assertFalse((self.root / 'pkg/b').exists())
+
+    def test_Repair(self):
+        links = {'pkg/a/x.h': '../../src/a/x.h'}
+        self.Sync(links)
+        (self.root / 'pkg/a/x.h').unlink()
+        SyncFakeRoot(self.root)
+        self.assertEqual(links, self.ListLinks())
+
+    def test_Configs(self):
+        # Links of the other configurations survive the sync.
+        self.Sync({'pkg/a/x.h': '../../src/a/x.h'})
+        WriteLinks(self.root / kFakeRootConfigLinksFile.format('dbg'),
+                   {'pkg/a/y.h': '../../src/a/y.h'})
+        SyncFakeRoot(self.root)
+        self.assertEqual({
+            'pkg/a/x.h': '../../src/a/x.h',
+            'pkg/a/y.h': '../../src/a/y.h',
+        }, self.ListLinks())
+        self.Sync({})
+        self.assertEqual({'pkg/a/y.h': '../../src/a/y.h'}, self.ListLinks())
+
+    def test_Unchanged(self):
+        links = {'pkg/a/x.h': '../../src/a/x.h'}
+        self.assertTrue(WriteLinks(self.root / kFakeRootLinksFile, links))
+        self.assertFalse(WriteLinks(self.root / kFakeRootLinksFile, links))
+
+    def test_Remove(self):
+        self.Sync({'pkg/a/x.h': '../../src/a/x.h'})
+        (self.root / 'pkg/a/x.h.o').write_text('')
+        RemoveFakeRoot(self.root)
+        self.assertEqual({}, self.ListLinks())
+        self.assertTrue((self.root / 'pkg/a/x.h.o').exists())
+        self.assertFalse((self.root / kFakeRootStamp).exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
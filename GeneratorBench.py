@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Measures the phases of build.ninja generation on synthetic trees and prints
+# one JSON object per tree, so that releases can be compared:
+#
+#   ./GeneratorBench.py [--packages=100,1000,4000] [--targets-per-package=3]
+#       [--srcs-per-target=4] [--depth=10] [--fan-out=3] [--fan-in=10]
+#
+# Packages are split into `depth` layers. Targets of a layer depend on
+# `fan-out` libraries of the layer below, chosen among so many of them that
+# every chosen library has about `fan-in` dependents. The top layer holds
+# binaries. Every tree is measured in a fresh process, so that its peak RSS
+# is its own. Ninja is not needed.
+
+import argparse
+import concurrent.futures
+import io
+import json
+import math
+import os
+import pathlib
+import random
+import resource
+import sys
+import tempfile
+import time
+
+import HandleTgBuild
+from BuildConfig import kNinjaFragmentsDir
+from PackageIndex import PackageIndex
+from PlanLevels import PlanLevels
+from SrcFs import SrcFs
+from Target import Target
+from TargetCache import TargetCache
+from TgVersion import kTgVersion
+
+
+def MakeSyntheticTree(srcRoot, packageCount, targetsPerPackage,
+                      srcsPerTarget, depth, fanOut, fanIn, seed=0):
+    # Writes TARGETS files and returns the package paths. Generation does not
+    # read sources, so they are not created.
+    rng = random.Random(seed)
+    (srcRoot / '.git').mkdir(parents=True)
+    layers = [[] for _ in range(max(1, min(depth, packageCount)))]
+    for i in range(packageCount):
+        layers[i * len(layers) // packageCount].append(
+            'l{}/p{}'.format(i * len(layers) // packageCount, i))
+    lowerTargets = []
+    for level, packages in enumerate(layers):
+        binaries = level + 1 == len(layers) and level > 0
+        targetCount = len(packages) * targetsPerPackage
+        # Every target picks fanOut of the popular libraries, so every
+        # popular library gets fanIn dependents on average.
+        popular = lowerTargets[:max(
+            fanOut, int(math.ceil(targetCount * fanOut / max(1, fanIn))))]
+        layerTargets = []
+        for package in packages:
+            packagePath = srcRoot / package
+            packagePath.mkdir(parents=True)
+            text = ''
+            for j in range(targetsPerPackage):
+                name = 't{}'.format(j)
+                srcs = ['{}_{}.cc'.format(name, k)
+                        for k in range(srcsPerTarget)]
+                deps = rng.sample(popular, min(fanOut, len(popular)))
+                text += ('{}(name={!r}, srcs={!r}, headers={!r}, '
+                         'deps={!r})\n').format(
+                             'cc_binary' if binaries else 'cc_library', name,
+                             srcs, [name + '.h'], deps)
+                layerTargets.append('//{}:{}'.format(package, name))
+            (packagePath / 'TARGETS').write_text(text)
+        lowerTargets = layerTargets
+    return ['//' + package for packages in layers for package in packages]
+
+
+def Measure(fn, *args):
+    startTime = time.perf_counter()
+    result = fn(*args)
+    return result, round(time.perf_counter() - startTime, 4)
+
+
+def CountManifest(tgPath, buildNinja):
+    # Returns the bytes and the edges of build.ninja and its fragments.
+    texts = [buildNinja]
+    fragmentsDir = tgPath / kNinjaFragmentsDir
+    for dirPath, _, fileNames in os.walk(str(fragmentsDir)):
+        for fileName in fileNames:
+            texts.append(
+                (pathlib.Path(dirPath) / fileName).read_text(encoding='utf-8'))
+    return (sum(len(text.encode('utf-8')) for text in texts),
+            sum(text.count('\nbuild ') for text in texts))
+
+
+def RunTree(options):
+    with tempfile.TemporaryDirectory() as tmpDir:
+        tgPath = pathlib.Path(tmpDir)
+        (tgPath / '.tgroot').write_text('')
+        paths = MakeSyntheticTree(
+            tgPath / 'src', options['packages'],
+            options['targets_per_package'], options['srcs_per_target'],
+            options['depth'], options['fan_out'], options['fan_in'])
+        srcFs = SrcFs(tgPath / 'src')
+        result = dict(options)
+
+        _, result['load_targets_s'] = Measure(
+            lambda: [Target.LoadTargets(srcFs, path) for path in paths])
+
+        targetCache = TargetCache(srcFs, jobs=1)
+        targetCache.LoadPaths(paths)
+        packageIndex = PackageIndex(srcFs, tgPath / 'packages.index')
+        targetRefs, result['list_targets_s'] = Measure(
+            HandleTgBuild.ListTargets, targetCache, packageIndex, '/')
+        targetRefs = tuple(sorted(targetRefs))
+        result['targets'] = len(targetRefs)
+
+        targetPlan, result['make_target_plan_s'] = Measure(
+            targetCache.MakeTargetPlan, targetRefs)
+        planLevels, result['plan_levels_s'] = Measure(PlanLevels, targetPlan)
+        result['levels'] = len(planLevels.GetWavefronts())
+        result['max_parallelism'] = planLevels.GetMaxParallelism()
+
+        for key in ['make_build_ninja_s', 'make_build_ninja_warm_s']:
+            # The second run finds the package fragments up to date.
+            ostream = io.StringIO()
+            _, result[key] = Measure(HandleTgBuild.MakeBuildNinja, tgPath,
+                                     srcFs, targetRefs, targetPlan, ostream)
+        result['manifest_bytes'], result['edges'] = CountManifest(
+            tgPath, ostream.getvalue())
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    peakRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result['peak_rss_kb'] = (peakRss // 1024
+                             if sys.platform == 'darwin' else peakRss)
+    result['tg_version'] = kTgVersion
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--packages', default='100,1000,4000')
+    parser.add_argument('--targets-per-package', type=int, default=3)
+    parser.add_argument('--srcs-per-target', type=int, default=4)
+    parser.add_argument('--depth', type=int, default=10)
+    parser.add_argument('--fan-out', type=int, default=3)
+    parser.add_argument('--fan-in', type=int, default=10)
+    args = parser.parse_args()
+    for packageCount in [
+            int(count) for count in args.packages.split(',') if count
+    ]:
+        options = {
+            'packages': packageCount,
+            'targets_per_package': args.targets_per_package,
+            'srcs_per_target': args.srcs_per_target,
+            'depth': args.depth,
+            'fan_out': args.fan_out,
+            'fan_in': args.fan_in,
+        }
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=1) as executor:
+            result = executor.submit(RunTree, options).result()
+        print(json.dumps(result, sort_keys=True), flush=True)
+
+
+if __name__ == '__main__':
+    main()
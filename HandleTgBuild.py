@@ -1,59 +1,169 @@
 # -*- coding: utf-8 -*-
 
+import collections
+import contextlib
+import fcntl
+import hashlib
 import os
-import io
 import ninja_syntax
 import pathlib
+import shlex
 import sys
 import subprocess
 
 import CCTargets
-from SrcFs import SrcFs
+from BuildConfig import (BuildConfig, ParseConfigName, kBuildNinjaFile,
+                         kFlagConfig)
+from BuildFingerprint import BuildFingerprint, InputStat, StatInput
+from CompileCache import (DefaultCompileCacheDir, ExpandUser,
+                          ReadCompileCacheStats, ResetCompileCacheStats,
+                          TrimCompileCache, kDefaultCompileCacheSize)
+from DepsClosure import DepsClosure
+from FakeRoot import SyncFakeRoot, WriteLinks, kFakeRootStamp
+from NinjaLog import FinishNinjaRun, StartNinjaRun
+from PackageIndex import PackageIndex, kDefaultIgnoreDirs
+from PersistentTargetCache import PersistentTargetCache
+from SrcFs import SrcFs, kDefaultLocalRootMarkers
 from TargetCache import TargetCache
 from TargetRef import TargetRef
+from TgConfig import TgConfig, kConfigFile
+from TgTrace import Span, StartTrace, StopTrace
+from TgVersion import kTgVersion
 
 kFlagNinjaTraining = '--ninja-training'
+kFlagSyncFakeRoot = '--sync-fake-root'
+kFlagUnity = '--unity'
+kFlagTrace = '--trace'
+kFlagStats = '--stats'
+kEnvTrace = 'TG_TRACE'
+kDefaultUnitySize = 8
+kTargetsCacheFile = '.tg/targets.cache'
+kPackageIndexFile = '.tg/packages.index'
+kBuildLockFile = '.tg/build.lock'
+kFingerprintPrefix = '# tg fingerprint '
+kUnityDir = '.tg/unity'
+# Languages of precompiled headers by the rules of compile edges.
+kPchLanguages = {'c_compile': 'c', 'cxx_compile': 'cxx'}
+# Ninja pools bounding the number of memory-hungry actions running at once:
+# names, settings in .tgroot and environment variables overriding them.
+kLinkPool = 'link_pool'
+kHeavyCompilePool = 'heavy_compile'
+kPools = [
+    (kLinkPool, 'link_pool_depth', 'TG_LINK_POOL_DEPTH'),
+    (kHeavyCompilePool, 'heavy_compile_pool_depth',
+     'TG_HEAVY_COMPILE_POOL_DEPTH'),
+]
+# Bump whenever the content generated for the same inputs changes.
+kNinjaFragmentVersion = 6
+kTokenPrefix = '# tg '
 
 
 def MakeToken(targetRefs):
-    return '# tg ' + ' '.join(str(targetRef) for targetRef in targetRefs)
+    return kTokenPrefix + ' '.join(str(targetRef) for targetRef in targetRefs)
 
 
-def GenerateFakeRoot(srcFs, targets, ninja):
-    symlinks = set()
+def ParseToken(token):
+    # Inverse of MakeToken(); an empty list if there is no token.
+    if token is None or not token.startswith(kTokenPrefix):
+        return []
+    result = []
+    for item in token[len(kTokenPrefix):].split():
+        path, name = item.rsplit(':', 1)
+        result.append(TargetRef(path=path, name=name))
+    return result
 
-    def generateSymlink(inputPath, outputPath):
-        ninja.build(
-            outputs=outputPath,
-            rule='symlink',
-            variables={
-                'relpath_in':
-                os.path.relpath(inputPath, os.path.dirname(outputPath))
-            },
-            order_only='build.ninja')
-        symlinks.add(outputPath)
 
+def MakeFragmentKey(*items):
+    digest = hashlib.sha1(str(kNinjaFragmentVersion).encode('utf-8'))
+    for item in items:
+        digest.update(b'\0')
+        digest.update(repr(item).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def WriteAtomically(realPath, writeFn):
+    # Readers, including concurrent tg and ninja processes, see either the
+    # old or the new content of the file, never a partial one.
+    tmpPath = realPath.with_name('{}.{}.tmp'.format(realPath.name,
+                                                   os.getpid()))
+    try:
+        with tmpPath.open('w', encoding='utf-8') as ostream:
+            writeFn(ostream)
+        os.replace(str(tmpPath), str(realPath))
+    except BaseException:
+        if tmpPath.exists():
+            tmpPath.unlink()
+        raise
+
+
+@contextlib.contextmanager
+def LockBuildNinja(tgPath):
+    # Serializes validation and generation of build.ninja between tg
+    # processes sharing TGPATH.
+    lockPath = tgPath / kBuildLockFile
+    lockPath.parent.mkdir(parents=True, exist_ok=True)
+    with lockPath.open('a') as lockFile:
+        fcntl.flock(lockFile.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lockFile.fileno(), fcntl.LOCK_UN)
+
+
+def WriteNinjaFragment(tgPath, fragmentPath, key, generateFn):
+    # Fragments are rewritten only if their key changed, so that retraining
+    # after a local edit touches only the affected packages. Returns the
+    # number of written edges, or None if the fragment was up to date.
+    header = '# tg fragment ' + key + '\n'
+    realPath = tgPath / fragmentPath
+    try:
+        with realPath.open('r', encoding='utf-8') as istream:
+            if istream.readline() == header:
+                return None
+    except FileNotFoundError:
+        pass
+    realPath.parent.mkdir(parents=True, exist_ok=True)
+    edgeCounts = []
+
+    def writeFragment(ostream):
+        ostream.write(header)
+        ninja = ninja_syntax.FastWriter(ostream)
+        generateFn(ninja)
+        ninja.flush()
+        edgeCounts.append(ninja.edge_count)
+
+    WriteAtomically(realPath, writeFragment)
+    return edgeCounts[0]
+
+
+def PackageFragmentPath(fragmentsDir, path):
+    # Package directories cannot start with a dot, so this never clashes
+    # with the fragment of a subpackage.
+    return fragmentsDir + path[1:] + '/.build.ninja'
+
+
+def ListFakeRootLinks(srcFs, targets):
+    # Maps every link of the fake root to its relative value.
+    links = dict()
     dirs = set()
-    for _, target in sorted(targets.items()):
-        for src in sorted(target.GetSrcs()):
+    for _, target in targets.items():
+        for src in target.GetSrcs():
             dirs.add(src.rsplit('/', 1)[0])
-        for header in sorted(target.GetHeaders()):
+            links['pkg' + src[1:]] = 'src' + src[1:]
+        for header in target.GetHeaders():
             dirs.add(header.rsplit('/', 1)[0])
-
-    for dir in sorted(dirs):
-        generateSymlink('pkg' + srcFs.FindLocalRoot(dir)[1:],
-                        'pkg' + dir[1:] + '/@')
-    for _, target in sorted(targets.items()):
-        for src in sorted(target.GetSrcs()):
-            generateSymlink(
-                'src' + src[1:],
-                'pkg' + src[1:], )
-        for header in sorted(target.GetHeaders()):
-            generateSymlink(
-                'src' + header[1:],
-                'pkg' + header[1:], )
-    ninja.build(outputs='fake_root', rule='phony', inputs=sorted(symlinks))
-    ninja.newline()
+            links['pkg' + header[1:]] = 'src' + header[1:]
+        precompiledHeader = target.GetPrecompiledHeader()
+        if precompiledHeader is not None:
+            dirs.add(precompiledHeader.rsplit('/', 1)[0])
+            links['pkg' + precompiledHeader[1:]] = (
+                'src' + precompiledHeader[1:])
+    for dir in dirs:
+        links['pkg' + dir[1:] + '/@'] = 'pkg' + srcFs.FindLocalRoot(dir)[1:]
+    return {
+        path: os.path.relpath(inputPath, os.path.dirname(path))
+        for path, inputPath in links.items()
+    }
 
 
 def IsCFile(src):
@@ -88,85 +198,237 @@ def ccObj(src):
     return 'pkg' + src[1:] + '.o'
 
 
+def ccTarget(targetRef):
+    # A phony edge building the target and its dependencies.
+    assert isinstance(targetRef, TargetRef)
+    return 'target' + str(targetRef)[1:]
+
+
 def ccInput(src):
     return 'pkg' + src[1:]
 
 
-def GenerateCCLibrary(target, transitiveDeps, ninja):
-    assert isinstance(target, CCTargets.CCLibrary)
-    compilerVariables = {}
-    tmp = set(target.GetCompilerFlags())
-    tmp.update(target.GetTransitiveCompilerFlags())
-    for dep in transitiveDeps:
-        tmp.update(dep.GetTransitiveCompilerFlags())
-    if tmp:
-        compilerVariables['extra_compiler_flags'] = ' '.join(sorted(tmp))
-    objs = set()
-    for src in sorted(target.GetSrcs()):
-        if IsHeaderFile(src):
-            continue
-        elif IsCFile(src):
-            compilerRule = 'c_compile'
-        elif IsCxxFile(src):
-            compilerRule = 'cxx_compile'
+def ccPch(header, compilerRule, compilerFlags):
+    # Variants of a precompiled header for different languages and sets of
+    # flags live in the directory `<header>.gch`, where GCC looks for them.
+    digest = hashlib.sha1(repr(compilerFlags).encode('utf-8')).hexdigest()
+    return 'pkg{}.gch/{}-{}'.format(header[1:], kPchLanguages[compilerRule],
+                                    digest[:16])
+
+
+def ccUnitySrc(targetRef, index, extension):
+    return '{}{}/{}-{}.{}'.format(kUnityDir, targetRef.path[1:],
+                                  targetRef.name, index, extension)
+
+
+def ccUnityObj(unitySrc):
+    # Sources cannot start with a dot, so this never clashes with ccObj().
+    path, name = unitySrc[len(kUnityDir):].rsplit('/', 1)
+    return 'pkg{}/.unity/{}.o'.format(path, name)
+
+
+def ccSource(src):
+    # The links of the fake root are not known to ninja, so compile edges
+    # depend on the sources themselves and compile them through the links.
+    return 'src' + src[1:]
+
+
+def IsCompiledFile(src):
+    return IsCFile(src) or IsCxxFile(src)
+
+
+def GenerateCompilerFlagsScope(targets, depsClosure, ninja):
+    # Binds every distinct set of compiler flags of the targets once per
+    # fragment, which is a scope of its own. The most common set becomes the
+    # default value of extra_compiler_flags; edges with other sets refer to
+    # them by name. Returns the variables of compile edges keyed by the
+    # sets of flags.
+    counts = collections.Counter()
+    for target in targets:
+        counts[depsClosure.GetCompilerFlags(target.GetTargetRef())] += sum(
+            1 for src in target.GetSrcs() if IsCompiledFile(src))
+    result = dict()
+    for i, (compilerFlags, _) in enumerate(counts.most_common()):
+        if i == 0:
+            if compilerFlags:
+                ninja.variable('extra_compiler_flags', ' '.join(compilerFlags))
+            result[compilerFlags] = {}
+        elif not compilerFlags:
+            result[compilerFlags] = {'extra_compiler_flags': ''}
         else:
-            raise RuntimeError('Unexpected file extension: ' + src)
-        objs.add(ccObj(src))
-        ninja.build(
-            outputs=ccObj(src),
-            rule=compilerRule,
-            inputs=ccInput(src),
-            order_only=['build.ninja', 'fake_root'],
-            variables=compilerVariables)
-    if objs:
+            name = 'compiler_flags_{}'.format(i)
+            ninja.variable(name, ' '.join(compilerFlags))
+            result[compilerFlags] = {'extra_compiler_flags': '$' + name}
+    if result:
+        ninja.newline()
+    return result
+
+
+def GetCompilerRule(src):
+    if IsCFile(src):
+        return 'c_compile'
+    elif IsCxxFile(src):
+        return 'cxx_compile'
+    raise RuntimeError('Unexpected file extension: ' + src)
+
+
+def GroupUnitySrcs(target, unitySize):
+    # Maps unity sources of the target to the groups of up to unitySize
+    # sources of the same language they include. A source that would be
+    # alone in its group is compiled as usual.
+    result = collections.OrderedDict()
+    if not unitySize or not target.GetUnityBuild():
+        return result
+    for compilerRule, extension in [('c_compile', 'c'),
+                                    ('cxx_compile', 'cc')]:
+        srcs = [
+            src for src in target.GetSrcs()
+            if IsCompiledFile(src) and GetCompilerRule(src) == compilerRule
+        ]
+        for i in range(0, len(srcs), unitySize):
+            group = srcs[i:i + unitySize]
+            if len(group) > 1:
+                result[ccUnitySrc(target.GetTargetRef(), i // unitySize,
+                                  extension)] = group
+    return result
+
+
+def WriteUnitySrc(tgPath, unitySrc, srcs):
+    # Unity sources are rewritten only if the list of sources changed, so
+    # that regeneration of build.ninja does not rebuild them.
+    text = '// Generated by tg.\n' + ''.join(
+        '#include "{}"\n'.format(
+            os.path.relpath(ccInput(src), os.path.dirname(unitySrc)))
+        for src in srcs)
+    realPath = tgPath / unitySrc
+    try:
+        if realPath.read_text(encoding='utf-8') == text:
+            return
+    except FileNotFoundError:
+        pass
+    realPath.parent.mkdir(parents=True, exist_ok=True)
+    WriteAtomically(realPath, lambda ostream: ostream.write(text))
+
+
+def GeneratePrecompiledHeaders(targets, depsClosure, compilerScope, outDir,
+                               ninja):
+    # Targets sharing a precompiled header and a set of flags share the
+    # variant of the header. The variant is compiled in the heavy pool if
+    # any of the targets opted into it.
+    pchs = collections.OrderedDict()
+    for target in targets:
+        precompiledHeader = target.GetPrecompiledHeader()
+        if precompiledHeader is None:
+            continue
+        compilerFlags = depsClosure.GetCompilerFlags(target.GetTargetRef())
+        for src in target.GetSrcs():
+            if IsHeaderFile(src):
+                continue
+            compilerRule = GetCompilerRule(src)
+            pch = outDir + ccPch(precompiledHeader, compilerRule,
+                                 compilerFlags)
+            heavyCompile = pch in pchs and pchs[pch][-1]
+            pchs[pch] = (compilerRule, precompiledHeader, compilerFlags,
+                         heavyCompile or target.GetHeavyCompile())
+    for pch, (compilerRule, precompiledHeader, compilerFlags,
+              heavyCompile) in pchs.items():
+        variables = dict(
+            compilerScope[compilerFlags], pkg_in=ccInput(precompiledHeader))
+        if heavyCompile:
+            variables['pool'] = kHeavyCompilePool
         ninja.build(
-            outputs=ccLib(target.GetTargetRef()),
-            rule='ar',
-            inputs=sorted(objs))
+            outputs=pch,
+            rule=kPchLanguages[compilerRule] + '_pch',
+            inputs=ccSource(precompiledHeader),
+            order_only=kFakeRootStamp,
+            variables=variables)
+    if pchs:
         ninja.newline()
 
 
-def GenerateCCBinary(target, transitiveDeps, ninja):
-    assert isinstance(target, CCTargets.CCBinary)
-    compilerVariables = {}
-    tmp = set(target.GetCompilerFlags())
-    tmp.update(target.GetTransitiveCompilerFlags())
-    for dep in transitiveDeps:
-        tmp.update(dep.GetTransitiveCompilerFlags())
-    if tmp:
-        compilerVariables['extra_compiler_flags'] = ' '.join(sorted(tmp))
-    linkerVariables = {}
-    tmp = set(target.GetLinkerFlags())
-    for dep in transitiveDeps:
-        tmp.update(dep.GetLinkerFlags())
-    if tmp:
-        linkerVariables['extra_linker_flags'] = ' '.join(sorted(tmp))
-    objs = set()
+def ListCCUnits(target, unitySize, outDir):
+    # Compilation units: (source, path in the fake root, object).
+    result = []
+    unitySrcs = GroupUnitySrcs(target, unitySize)
+    for unitySrc in unitySrcs.keys():
+        result.append((unitySrc, unitySrc, outDir + ccUnityObj(unitySrc)))
+    grouped = set(src for srcs in unitySrcs.values() for src in srcs)
     for src in sorted(target.GetSrcs()):
-        if IsHeaderFile(src):
+        if IsHeaderFile(src) or src in grouped:
             continue
-        elif IsCFile(src):
-            compilerRule = 'c_compile'
-        elif IsCxxFile(src):
-            compilerRule = 'cxx_compile'
-        else:
-            raise RuntimeError('Unexpected file extension: ' + src)
-        objs.add(ccObj(src))
+        result.append((ccSource(src), ccInput(src), outDir + ccObj(src)))
+    return result
+
+
+def GenerateCCObjects(target, depsClosure, compilerScope, unitySize, outDir,
+                      ninja):
+    compilerFlags = depsClosure.GetCompilerFlags(target.GetTargetRef())
+    compilerVariables = compilerScope[compilerFlags]
+    precompiledHeader = target.GetPrecompiledHeader()
+    objs = set()
+    for src, pkgInput, obj in ListCCUnits(target, unitySize, outDir):
+        compilerRule = GetCompilerRule(src)
+        variables = dict(compilerVariables, pkg_in=pkgInput)
+        implicit = None
+        if precompiledHeader is not None:
+            implicit = outDir + ccPch(precompiledHeader, compilerRule,
+                                      compilerFlags)
+            compilerRule += '_pch'
+            variables['pch'] = implicit
+            # GCC looks for `<header>.gch` even if the header is not there.
+            variables['pch_header'] = outDir + ccInput(precompiledHeader)
+        if target.GetHeavyCompile():
+            variables['pool'] = kHeavyCompilePool
+        objs.add(obj)
         ninja.build(
-            outputs=ccObj(src),
+            outputs=obj,
             rule=compilerRule,
-            inputs=ccInput(src),
-            order_only=['build.ninja', 'fake_root'],
-            variables=compilerVariables)
+            inputs=src,
+            implicit=implicit,
+            order_only=kFakeRootStamp,
+            variables=variables)
+    return objs
+
+
+def GenerateCCLibrary(target, depsClosure, compilerScope, unitySize, outDir,
+                      ninja):
+    assert isinstance(target, CCTargets.CCLibrary)
+    objs = GenerateCCObjects(target, depsClosure, compilerScope, unitySize,
+                             outDir, ninja)
+    if not objs:
+        return []
+    lib = outDir + ccLib(target.GetTargetRef())
+    ninja.build(outputs=lib, rule='ar', inputs=sorted(objs))
+    ninja.newline()
+    return [lib]
+
+
+def GenerateCCBinary(target, depsClosure, compilerScope, unitySize,
+                     linkObjects, outDir, ninja):
+    assert isinstance(target, CCTargets.CCBinary)
+    linkerVariables = {}
+    linkerFlags = depsClosure.GetLinkerFlags(target.GetTargetRef())
+    if linkerFlags:
+        linkerVariables['extra_linker_flags'] = ' '.join(linkerFlags)
+    objs = GenerateCCObjects(target, depsClosure, compilerScope, unitySize,
+                             outDir, ninja)
     objs = sorted(objs)
-    for dep in transitiveDeps:
-        if dep.GetSrcs():
-            objs.append(ccLib(dep.GetTargetRef()))
+    for dep in depsClosure.GetTransitiveDeps(target.GetTargetRef()):
+        if not dep.GetSrcs():
+            continue
+        if linkObjects:
+            # Every object is linked, as if the library was a whole archive.
+            objs.extend(
+                obj for _, _, obj in ListCCUnits(dep, unitySize, outDir))
+        else:
+            objs.append(outDir + ccLib(dep.GetTargetRef()))
+    binary = outDir + ccBin(target.GetTargetRef())
     ninja.build(
-        outputs=ccBin(target.GetTargetRef()),
-        rule='cxx_link',
-        inputs=objs,
-        variables=linkerVariables)
+        outputs=binary, rule='cxx_link', inputs=objs, variables=linkerVariables)
+    if outDir:
+        # Only binaries of the default configuration are linked into src/.
+        ninja.newline()
+        return [binary]
     ninja.build(
         outputs=ccBinSymlink(target.GetTargetRef()),
         rule='symlink',
@@ -177,26 +439,16 @@ def GenerateCCBinary(target, transitiveDeps, ninja):
                 os.path.dirname(ccBinSymlink(target.GetTargetRef())))
         }, )
     ninja.newline()
+    return [binary, ccBinSymlink(target.GetTargetRef())]
 
 
-def MakeBuildNinja(tgPath, srcFs, targetRefs, targetPlan):
-    ninjaBuffer = io.StringIO()
-    ninja = ninja_syntax.Writer(ninjaBuffer)
-    ninja.comment('build.ninja')
-    ninja.newline()
-
-    ninja.variable('ninja_required_version', '1.3')
-    ninja.newline()
-
-    ninja.variable('builddir', '.')
-    ninja.newline()
-
-    ninja.variable('ar', 'ar')
-    ninja.variable('ln', 'ln -snf')
-    ninja.variable('rm', 'rm -r -f')
-    ninja.variable('tg', 'tg')
-    ninja.newline()
-
+def MakeToolchain(buildConfig=None):
+    buildConfig = buildConfig or BuildConfig()
+    result = collections.OrderedDict()
+    result['ar'] = 'ar'
+    result['ln'] = 'ln -snf'
+    result['rm'] = 'rm -r -f'
+    result['tg'] = 'tg'
     ccFlags = [
         '-fdiagnostics-absolute-paths',
         '-O2',
@@ -218,49 +470,133 @@ def MakeBuildNinja(tgPath, srcFs, targetRefs, targetPlan):
         #'-S', '-mllvm', '--x86-asm-syntax=intel',
     ]
     if os.uname().sysname == 'Darwin':
-        ninja.variable('cc', 'clang')
-        ninja.variable('cxx', 'clang++')
-        ninja.variable('cc_flags', ccFlags + ['-std=c17'])
-        ninja.variable('cxx_flags', ccFlags + ['-std=c++2b', '-stdlib=libc++'])
+        result['ar_flags'] = 'crs'
+        result['cc'] = 'clang'
+        result['cxx'] = 'clang++'
+        result['cc_flags'] = ccFlags + ['-std=c17']
+        result['cxx_flags'] = ccFlags + ['-std=c++2b', '-stdlib=libc++']
     else:
-        ninja.variable('cc', 'gcc')
-        ninja.variable('cxx', 'g++')
-        ninja.variable(
-            'cc_flags', ccFlags +
-            ['-std=c17', '-mcpu=native', '-Wshadow=local', '-Wno-psabi'])
-        ninja.variable(
-            'cxx_flags', ccFlags +
-            ['-std=c++20', '-mcpu=native', '-Wshadow=local', '-Wno-psabi'])
+        # Thin archives refer to the objects instead of copying them.
+        result['ar_flags'] = 'crsT'
+        result['cc'] = 'gcc'
+        result['cxx'] = 'g++'
+        result['cc_flags'] = ccFlags + [
+            '-std=c17', '-mcpu=native', '-Wshadow=local', '-Wno-psabi'
+        ]
+        result['cxx_flags'] = ccFlags + [
+            '-std=c++20', '-mcpu=native', '-Wshadow=local', '-Wno-psabi'
+        ]
+    result['cc_flags'] += buildConfig.GetCompilerFlags()
+    result['cxx_flags'] += buildConfig.GetCompilerFlags()
+    result['linker_flags'] = list(buildConfig.GetLinkerFlags())
+    return result
+
+
+def MakeBuildNinja(tgPath,
+                   srcFs,
+                   targetRefs,
+                   targetPlan,
+                   ostream,
+                   unitySize=None,
+                   compileCacheDir=None,
+                   poolDepths=None,
+                   linkObjects=False,
+                   buildConfig=None):
+    buildConfig = buildConfig or BuildConfig()
+    outDir = buildConfig.GetOutDir()
+    ninja = ninja_syntax.FastWriter(ostream)
+    ninja.comment(buildConfig.GetBuildNinja())
     ninja.newline()
 
-    ninja.rule(
-        name='c_compile',
-        command=
-        '$cc $cc_flags -MMD -MT $out -MF $out.d -c $in -o $out $extra_compiler_flags',
-        description='Building C file $in',
-        depfile='$out.d',
-        deps='gcc')
+    ninja.variable('ninja_required_version', '1.3')
     ninja.newline()
 
-    ninja.rule(
-        name='cxx_compile',
-        command=
-        '$cxx $cxx_flags -MMD -MT $out -MF $out.d -c $in -o $out $extra_compiler_flags',
-        description='Building C++ file $in',
-        depfile='$out.d',
-        deps='gcc')
+    ninja.variable('builddir', buildConfig.GetBuildDir())
     ninja.newline()
 
+    if poolDepths is None:
+        poolDepths = GetPoolDepths(TgConfig(), {})
+    for name, depth in poolDepths:
+        ninja.pool(name, depth)
+        ninja.newline()
+
+    toolchain = MakeToolchain(buildConfig)
+    for name, value in toolchain.items():
+        ninja.variable(name, value)
+    ninja.newline()
+
+    if toolchain['cxx'].startswith('clang'):
+        pchInput = '$pkg_in'
+        pchFlags = '-include-pch $pch'
+    else:
+        # GCC warns about `#pragma once` in a header compiled as the main
+        # file, so the header is included into an empty one instead.
+        pchInput = '-include $pkg_in /dev/null'
+        # GCC picks the variant matching the flags by itself.
+        pchFlags = '-include $pch_header'
+    compileCache = ''
+    if compileCacheDir is not None:
+        compileCache = '$tg compile-cache {} -- '.format(
+            shlex.quote(compileCacheDir))
+    for language, compiler, description, headerLanguage in [
+        ('c', 'cc', 'C', 'c-header'),
+        ('cxx', 'cxx', 'C++', 'c++-header'),
+    ]:
+        ninja.rule(
+            name=language + '_compile',
+            command=
+            '{1}${0} ${0}_flags -MMD -MT $out -MF $out.d -c $pkg_in -o $out $extra_compiler_flags'.
+            format(compiler, compileCache),
+            description='Building {} file $pkg_in'.format(description),
+            depfile='$out.d',
+            deps='gcc')
+        ninja.newline()
+
+        ninja.rule(
+            name=language + '_compile_pch',
+            command=
+            '${0} ${0}_flags -MMD -MT $out -MF $out.d {1} -c $pkg_in -o $out $extra_compiler_flags'.
+            format(compiler, pchFlags),
+            description='Building {} file $pkg_in'.format(description),
+            depfile='$out.d',
+            deps='gcc')
+        ninja.newline()
+
+        # -MD since the headers of the tree come in through -isystem, and
+        # -MMD leaves them out.
+        ninja.rule(
+            name=language + '_pch',
+            command=
+            '${0} ${0}_flags -MD -MT $out -MF $out.d -x {1} -c {2} -o $out $extra_compiler_flags'.
+            format(compiler, headerLanguage, pchInput),
+            description='Precompiling {} header $pkg_in'.format(description),
+            depfile='$out.d',
+            deps='gcc')
+        ninja.newline()
+
+    # Inputs of links and archives are passed in response files, since
+    # binaries may have thousands of them.
     ninja.rule(
         name='cxx_link',
-        command='$cxx $cxx_flags $in -o $out $extra_linker_flags',
-        description='Linking $out', )
+        command=
+        '$cxx $cxx_flags @$out.rsp -o $out $linker_flags $extra_linker_flags',
+        description='Linking $out',
+        pool=kLinkPool,
+        rspfile='$out.rsp',
+        rspfile_content='$in', )
     ninja.newline()
 
+    if os.uname().sysname == 'Darwin':
+        # Apple's ar reads no response files.
+        arCommand = '$rm $out && xargs $ar $ar_flags $out < $out.rsp'
+    else:
+        arCommand = '$rm $out && $ar $ar_flags $out @$out.rsp'
     ninja.rule(
         name='ar',
-        command='$rm $out && $ar crs $out $in',
-        description='Creating archive $out', )
+        command=arCommand,
+        description='Creating archive $out',
+        rspfile='$out.rsp',
+        rspfile_content='$in', )
     ninja.newline()
 
     ninja.rule(
@@ -270,64 +606,200 @@ def MakeBuildNinja(tgPath, srcFs, targetRefs, targetPlan):
     ninja.newline()
     ninja.newline()
 
+    ninja.rule(
+        name='sync_fake_root',
+        command='$tg build {}'.format(kFlagSyncFakeRoot),
+        description='Syncing fake root', )
+    ninja.newline()
+
     ninja.rule(
         name='rebuild_ninja',
-        command='$tg build {} $target_refs'.format(kFlagNinjaTraining),
-        description='Ninja training')
+        command='$tg build {} $build_flags $target_refs'.format(
+            kFlagNinjaTraining),
+        description='Ninja training',
+        generator=True)
     ninja.newline()
 
+    regenInputs = sorted(
+        set(
+            str(
+                srcFs.MakeRealPath(targetRef.path).relative_to(tgPath) /
+                'TARGETS') for targetRef in targetPlan.keys()))
+    # Only TGPATH may be set, without a config file.
+    if (tgPath / kConfigFile).exists():
+        regenInputs.append(kConfigFile)
     ninja.build(
         outputs=[
-            'build.ninja',
+            buildConfig.GetBuildNinja(),
         ],
         rule='rebuild_ninja',
         variables={
+            'build_flags': MakeBuildFlags(unitySize, buildConfig),
             'target_refs': [str(targetRef) for targetRef in targetRefs],
         },
-        implicit=sorted(
-            set(
-                str(
-                    srcFs.MakeRealPath(targetRef.path).relative_to(tgPath) /
-                    'TARGETS') for targetRef in targetPlan.keys())))
+        implicit=regenInputs)
     ninja.newline()
 
-    GenerateFakeRoot(srcFs, targetPlan, ninja)
-
-    transitiveDepsDict = dict()
-    for target in targetPlan.values():
-        transitiveDeps = []
-        for depRef in target.GetDeps():
-            transitiveDeps.append(targetPlan[depRef])
-            transitiveDeps.extend(transitiveDepsDict[depRef])
-        # preserve only the latest entrance of each dependency
-        visited = set()
-        tmp = []
-        for dep in reversed(transitiveDeps):
-            if dep.GetTargetRef() not in visited:
-                visited.add(dep.GetTargetRef())
-                tmp.append(dep)
-        transitiveDepsDict[target.GetTargetRef()] = list(reversed(tmp))
+    with Span('ListFakeRootLinks') as span:
+        links = ListFakeRootLinks(srcFs, targetPlan)
+        span.Set(
+            symlinks=len(links),
+            written=WriteLinks(tgPath / buildConfig.GetFakeRootLinksFile(),
+                               links))
+    ninja.build(
+        outputs=kFakeRootStamp,
+        rule='sync_fake_root',
+        inputs=buildConfig.GetFakeRootLinksFile())
+    ninja.newline()
 
+    with Span('DepsClosure', targets=len(targetPlan)):
+        depsClosure = DepsClosure(targetPlan)
+    packages = collections.defaultdict(list)
     for targetRef, target in targetPlan.items():
-        if isinstance(target, CCTargets.CCLibrary):
-            GenerateCCLibrary(target, transitiveDepsDict[targetRef], ninja)
-        elif isinstance(target, CCTargets.CCBinary):
-            GenerateCCBinary(target, transitiveDepsDict[targetRef], ninja)
-        else:
-            assert False
+        packages[targetRef.path].append(target)
+
+    def generatePackage(targets, ninja):
+        compilerScope = GenerateCompilerFlagsScope(targets, depsClosure,
+                                                   ninja)
+        GeneratePrecompiledHeaders(targets, depsClosure, compilerScope,
+                                   outDir, ninja)
+        for target in targets:
+            if isinstance(target, CCTargets.CCLibrary):
+                outputs = GenerateCCLibrary(target, depsClosure,
+                                            compilerScope, unitySize, outDir,
+                                            ninja)
+            elif isinstance(target, CCTargets.CCBinary):
+                outputs = GenerateCCBinary(target, depsClosure,
+                                           compilerScope, unitySize,
+                                           linkObjects, outDir, ninja)
+            else:
+                assert False
+            ninja.build(
+                outputs=ccTarget(target.GetTargetRef()),
+                rule='phony',
+                inputs=outputs + [ccTarget(dep) for dep in target.GetDeps()])
+            ninja.newline()
+
+    def makeTargetKey(target):
+        targetRef = target.GetTargetRef()
+        result = (str(target), depsClosure.GetCompilerFlags(targetRef))
+        if isinstance(target, CCTargets.CCBinary):
+            deps = [
+                dep for dep in depsClosure.GetTransitiveDeps(targetRef)
+                if dep.GetSrcs()
+            ]
+            result += (depsClosure.GetLinkerFlags(targetRef),
+                       [dep.GetTargetRef() for dep in deps])
+            if linkObjects:
+                result += ([
+                    obj for dep in deps
+                    for _, _, obj in ListCCUnits(dep, unitySize, outDir)
+                ], )
+        return result
+
+    for path, targets in sorted(packages.items()):
+        with Span('WritePackage', path=path) as span:
+            # The key covers everything the generated edges depend on: the
+            # normalized targets and what they inherit from their
+            # dependencies.
+            key = MakeFragmentKey(
+                unitySize, linkObjects, outDir,
+                *[makeTargetKey(target) for target in targets])
+            for target in targets:
+                for unitySrc, srcs in GroupUnitySrcs(target,
+                                                     unitySize).items():
+                    WriteUnitySrc(tgPath, unitySrc, srcs)
+            fragmentPath = PackageFragmentPath(
+                buildConfig.GetNinjaFragmentsDir(), path)
+            edgeCount = WriteNinjaFragment(
+                tgPath, fragmentPath, key,
+                lambda ninja, targets=targets: generatePackage(targets, ninja))
+            span.Set(
+                targets=len(targets),
+                written=edgeCount is not None,
+                edges=edgeCount or 0)
+        ninja.subninja(fragmentPath)
+    ninja.flush()
+
+
+def ParseUnitySize(arg):
+    if arg == kFlagUnity:
+        return kDefaultUnitySize
+    value = arg[len(kFlagUnity) + 1:]
+    assert value.isdigit() and int(
+        value) > 0, '{}: Invalid unity size.'.format(arg)
+    return int(value)
 
-    return MakeToken(targetRefs) + '\n' + ninjaBuffer.getvalue()
+
+def MakeBuildFlags(unitySize, buildConfig=None):
+    # Flags of tg build that affect build.ninja, for the rebuild command.
+    result = []
+    if unitySize:
+        result.append('{}={}'.format(kFlagUnity, unitySize))
+    if buildConfig is not None and buildConfig.GetName() is not None:
+        result.append('{}={}'.format(kFlagConfig, buildConfig.GetName()))
+    return result
+
+
+def MakeBuildFingerprint(tgPath, srcFs, header, persistentCache,
+                         targetPlan):
+    inputs = dict()
+    for path in set(targetRef.path for targetRef in targetPlan):
+        inputs[str(
+            srcFs.MakeRealPath(srcFs.CombinePaths(path, 'TARGETS'))
+            .relative_to(tgPath))] = InputStat(
+                *persistentCache.GetInputStat(path))
+    inputs[kConfigFile] = StatInput(tgPath / kConfigFile)
+    return BuildFingerprint(header, inputs)
 
 
-def ValidateBuildNinjaToken(tgPath, targetRefs):
-    buildNinjaPath = tgPath / 'build.ninja'
-    if not buildNinjaPath.exists():
+def ReadBuildNinjaHeader(tgPath, buildNinja=kBuildNinjaFile):
+    try:
+        with (tgPath / buildNinja).open('r', encoding='utf-8') as istream:
+            return istream.readline().rstrip('\n'), istream.readline(
+            ).rstrip('\n')
+    except FileNotFoundError:
+        return None, None
+
+
+def ValidateBuildNinja(tgPath, header, buildConfig):
+    # Checks by stat that build.ninja was generated from the current inputs.
+    # If some inputs were touched without changing, their stats are
+    # refreshed, so that neither tg nor ninja retrains for them.
+    fingerprintPath = tgPath / buildConfig.GetFingerprintFile()
+    fingerprint = BuildFingerprint.Load(fingerprintPath)
+    if fingerprint is None or fingerprint.GetHeader() != header:
+        return False
+    if ReadBuildNinjaHeader(tgPath, buildConfig.GetBuildNinja()) != (
+            header[-1], kFingerprintPrefix + fingerprint.GetDigest()):
         return False
-    with buildNinjaPath.open('r', encoding='utf-8') as istream:
-        return istream.readline().strip() == MakeToken(targetRefs)
+    updated = fingerprint.Revalidate(tgPath)
+    if updated is None:
+        return False
+    if updated:
+        fingerprint.Save(fingerprintPath)
+        # An input of the manifest changed without changing it; keeps its
+        # regeneration edge from rerunning tg.
+        os.utime(str(tgPath / buildConfig.GetBuildNinja()))
+        RestatBuildNinja(tgPath, buildConfig)
+    return True
+
 
+def RestatBuildNinja(tgPath, buildConfig):
+    # Records the current mtime of build.ninja in the ninja log; otherwise
+    # ninja considers a manifest written or touched by tg out of date and
+    # retrains. It costs an extra ninja process that loads the manifest and
+    # rewrites the whole log in the order of a hash table, which tg profile
+    # does not depend on.
+    if (tgPath / buildConfig.GetBuildDir() / '.ninja_log').exists():
+        subprocess.call(
+            buildConfig.MakeNinjaCommand(tgPath) +
+            ['-t', 'restat', buildConfig.GetBuildNinja()],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL)
 
-def ListTargets(targetCache, pattern):
+
+def ListTargets(targetCache, packageIndex, pattern):
     # currentPath
     srcFs = targetCache.GetSrcFs()
     srcFsRoot = srcFs.GetRealSrcRoot()
@@ -357,31 +829,298 @@ def ListTargets(targetCache, pattern):
     if name:
         result.append(TargetRef(path=path, name=name))
     else:
-        for realPath in srcFs.MakeRealPath(path).rglob('TARGETS'):
-            if realPath.is_file():
-                result.extend(
-                    targetCache.GetTargets(srcFs.MakePath(realPath.parent))
-                    .keys())
+        paths = packageIndex.ListPackages(path)
+        targetCache.LoadPaths(paths)
+        for path in paths:
+            result.extend(targetCache.GetTargets(path).keys())
     return result
 
 
-def HandleTgBuild(tgPath, args):
-    srcFs = SrcFs(tgPath / 'src')
-    targetCache = TargetCache(srcFs)
+def ListExistingTargets(targetCache, targetRefs):
+    # Drops the targets whose packages or definitions are gone.
+    targetCache.LoadPaths(set(targetRef.path for targetRef in targetRefs))
+    result = []
+    for targetRef in targetRefs:
+        try:
+            targets = targetCache.GetTargets(targetRef.path)
+        except Exception:
+            continue
+        if targetRef in targets:
+            result.append(targetRef)
+    return result
+
+
+def MakeCumulativePlan(targetCache, targetRefs, previousRefs):
+    # Returns the targets of the manifest, which are the requested ones and
+    # the still existing ones of previous builds, and their plan. If the
+    # previous targets no longer plan, e.g. since an edit broke one of their
+    # dependencies, the manifest starts over from the requested targets.
+    requested = set(targetRefs)
+    manifestRefs = tuple(
+        sorted(
+            requested.union(
+                ListExistingTargets(targetCache, [
+                    targetRef for targetRef in previousRefs
+                    if targetRef not in requested
+                ]))))
+    if manifestRefs != targetRefs:
+        try:
+            return manifestRefs, targetCache.MakeTargetPlan(manifestRefs)
+        except AssertionError:
+            if not targetRefs:
+                raise
+    return targetRefs, targetCache.MakeTargetPlan(targetRefs)
+
+
+def MakeNinjaTargets(targetRefs, manifestRefs):
+    # The requested targets are a part of the manifest; without explicit
+    # targets ninja builds all of it.
+    if len(targetRefs) == len(manifestRefs):
+        return []
+    return [ccTarget(targetRef) for targetRef in targetRefs]
+
+
+class BuildState:
+    # State that may be reused by consecutive builds in the same environment.
+    # The caches it holds revalidate themselves by file mtimes.
+
+    def __init__(self, tgPath):
+        self.__tgPath = tgPath
+        self.__srcFs = None
+        self.__config = None
+        self.__persistentCache = PersistentTargetCache(
+            tgPath / kTargetsCacheFile)
+        self.__indexSettings = None
+        self.__packageIndex = None
+
+    def Refresh(self):
+        self.__config = TgConfig.Load(self.__tgPath)
+        localRootMarkers = kDefaultLocalRootMarkers + tuple(
+            marker for marker in self.__config.GetStringList(
+                'local_root_markers')
+            if marker not in kDefaultLocalRootMarkers)
+        self.__srcFs = SrcFs(self.__tgPath / 'src', localRootMarkers)
+        ignoreDirs = kDefaultIgnoreDirs + self.__config.GetStringList(
+            'ignore_dirs')
+        if (ignoreDirs, localRootMarkers) != self.__indexSettings:
+            self.__indexSettings = (ignoreDirs, localRootMarkers)
+            self.__packageIndex = PackageIndex(
+                self.__srcFs, self.__tgPath / kPackageIndexFile, ignoreDirs)
+        # The previous srcFs with its memoized paths is dropped, so that a
+        # long-running server does not accumulate them.
+        self.__packageIndex.Refresh(self.__srcFs)
+        # Local roots are found by the entries of the indexed directories.
+        self.__srcFs.SetIsLocalRootFn(self.__packageIndex.IsLocalRoot)
+
+    def GetTgPath(self):
+        return self.__tgPath
+
+    def GetSrcFs(self):
+        return self.__srcFs
+
+    def GetConfig(self):
+        return self.__config
+
+    def GetPersistentCache(self):
+        return self.__persistentCache
+
+    def GetPackageIndex(self):
+        return self.__packageIndex
+
+
+def GetCompileCacheDir(config, environ):
+    # Resolved in the environment of the build, which is not the environment
+    # of tg server.
+    if not config.GetBool('compile_cache'):
+        return None
+    return os.path.abspath(
+        ExpandUser(
+            config.GetString('compile_cache_dir',
+                             DefaultCompileCacheDir(environ)), environ))
+
+
+def GetPoolDepths(config, environ):
+    # The environment of the build overrides .tgroot. By default a quarter
+    # of the CPUs may run memory-hungry actions at once.
+    defaultDepth = max(1, (os.cpu_count() or 1) // 4)
+    result = []
+    for name, configName, envName in kPools:
+        depth = config.GetInt(configName, defaultDepth)
+        value = environ.get(envName)
+        if value is not None:
+            assert value.isdigit(), '{}: {}: Invalid pool depth.'.format(
+                envName, value)
+            depth = int(value)
+        assert depth > 0, '{}: {}: Pool depth must be positive.'.format(
+            configName, depth)
+        result.append((name, depth))
+    return tuple(result)
+
+
+def _RunTgBuild(buildState, args, callFn, writeFn, environ):
+    with Span('Refresh'):
+        buildState.Refresh()
+    tgPath = buildState.GetTgPath()
+    srcFs = buildState.GetSrcFs()
+    targetCache = TargetCache(srcFs, buildState.GetPersistentCache())
+    packageIndex = buildState.GetPackageIndex()
+    compileCacheDir = GetCompileCacheDir(buildState.GetConfig(), environ)
+    poolDepths = GetPoolDepths(buildState.GetConfig(), environ)
+    linkObjects = buildState.GetConfig().GetBool('link_objects')
     ninjaTrainingMode = False
+    unitySize = None
+    configNames = []
     targetRefs = set()
-    for arg in args:
-        if arg == kFlagNinjaTraining:
-            ninjaTrainingMode = True
-            continue
-        targetRefs.update(ListTargets(targetCache, arg))
+    with Span('ListTargets') as span:
+        for arg in args:
+            if arg == kFlagNinjaTraining:
+                ninjaTrainingMode = True
+                continue
+            if arg == kFlagUnity or arg.startswith(kFlagUnity + '='):
+                unitySize = ParseUnitySize(arg)
+                continue
+            if arg.startswith(kFlagConfig + '='):
+                name = ParseConfigName(arg)
+                if name not in configNames:
+                    configNames.append(name)
+                continue
+            targetRefs.update(ListTargets(targetCache, packageIndex, arg))
+        packageIndex.Save()
+        span.Set(targets=len(targetRefs))
     targetRefs = tuple(sorted(targetRefs))
     assert targetRefs, "tg build: List of targets is expected."
-    # Ninja training
-    if ninjaTrainingMode or not ValidateBuildNinjaToken(tgPath, targetRefs):
-        with (tgPath / 'build.ninja').open('w', encoding='utf-8') as ostream:
-            ostream.write(
-                MakeBuildNinja(tgPath, srcFs, targetRefs,
-                               targetCache.MakeTargetPlan(targetRefs)))
-    if not ninjaTrainingMode:
-        sys.exit(subprocess.call(['ninja', '-C', str(tgPath)]))
+    buildConfigs = [
+        BuildConfig.Load(buildState.GetConfig(), name) for name in configNames
+    ] or [BuildConfig()]
+
+    def makeHeader(buildConfig, manifestRefs):
+        return (kTgVersion, MakeFragmentKey(MakeToolchain(buildConfig)),
+                tuple(MakeBuildFlags(unitySize, buildConfig)),
+                compileCacheDir, poolDepths, linkObjects,
+                MakeToken(manifestRefs))
+
+    ninjaCommands = []
+    with LockBuildNinja(tgPath):
+        for buildConfig in buildConfigs:
+            # The manifest keeps the targets of previous builds until tg
+            # clean, so that switching between them needs no ninja training.
+            # Ninja training started by ninja passes the targets of the
+            # manifest.
+            previousRefs = ParseToken(
+                ReadBuildNinjaHeader(tgPath, buildConfig.GetBuildNinja())[0])
+            requestedRefs = tuple() if ninjaTrainingMode else targetRefs
+            manifestRefs = tuple(sorted(set(targetRefs).union(previousRefs)))
+            header = makeHeader(buildConfig, manifestRefs)
+            # A concurrent tg may have just generated the same build.ninja.
+            with Span('ValidateBuildNinja',
+                      config=buildConfig.GetName()) as span:
+                valid = not ninjaTrainingMode and ValidateBuildNinja(
+                    tgPath, header, buildConfig)
+                span.Set(valid=valid)
+            if valid:
+                ninjaCommands.append(
+                    buildConfig.MakeNinjaCommand(tgPath) +
+                    MakeNinjaTargets(targetRefs, manifestRefs))
+                continue
+            with Span('MakeTargetPlan') as span:
+                manifestRefs, targetPlan = MakeCumulativePlan(
+                    targetCache, requestedRefs,
+                    set(targetRefs).union(previousRefs))
+                span.Set(targets=len(targetPlan))
+            header = makeHeader(buildConfig, manifestRefs)
+            ninjaCommands.append(
+                buildConfig.MakeNinjaCommand(tgPath) +
+                MakeNinjaTargets(targetRefs, manifestRefs))
+            with Span('MakeBuildFingerprint'):
+                fingerprint = MakeBuildFingerprint(
+                    tgPath, srcFs, header, buildState.GetPersistentCache(),
+                    targetPlan)
+
+            def writeBuildNinja(ostream):
+                ostream.write(header[-1] + '\n')
+                ostream.write(kFingerprintPrefix + fingerprint.GetDigest() +
+                              '\n')
+                MakeBuildNinja(tgPath, srcFs, manifestRefs, targetPlan,
+                               ostream, unitySize, compileCacheDir,
+                               poolDepths, linkObjects, buildConfig)
+
+            with Span('MakeBuildNinja', config=buildConfig.GetName()):
+                WriteAtomically(tgPath / buildConfig.GetBuildNinja(),
+                                writeBuildNinja)
+                fingerprint.Save(tgPath / buildConfig.GetFingerprintFile())
+            if not ninjaTrainingMode:
+                RestatBuildNinja(tgPath, buildConfig)
+    with Span('SaveTargetCache'):
+        targetCache.Save()
+        # With the local roots found since the listing of targets.
+        packageIndex.Save()
+    if ninjaTrainingMode:
+        return 0
+
+    def runNinja():
+        # Ninja keeps one pair of logs per run, so every configuration is
+        # built by a ninja of its own, one after another.
+        for buildConfig, ninjaCommand in zip(buildConfigs, ninjaCommands):
+            # Marks the actions of this run in the log for tg profile.
+            buildDir = tgPath / buildConfig.GetBuildDir()
+            logState = StartNinjaRun(buildDir)
+            with Span('ninja', config=buildConfig.GetName()):
+                exitCode = callFn(ninjaCommand)
+            FinishNinjaRun(buildDir, logState)
+            if exitCode != 0:
+                return exitCode
+        return 0
+
+    if compileCacheDir is None:
+        return runNinja()
+    ResetCompileCacheStats(tgPath)
+    exitCode = runNinja()
+    hits, misses = ReadCompileCacheStats(tgPath)
+    if hits or misses:
+        writeFn('tg: Compile cache: {} hits, {} misses ({:.0f}% hits).\n'.
+                format(hits, misses, 100.0 * hits / (hits + misses)))
+    if misses:
+        TrimCompileCache(
+            compileCacheDir,
+            buildState.GetConfig().GetInt('compile_cache_size',
+                                          kDefaultCompileCacheSize))
+    return exitCode
+
+
+def RunTgBuild(buildState,
+               args,
+               callFn=subprocess.call,
+               writeFn=sys.stdout.write,
+               environ=os.environ,
+               errorFn=sys.stderr.write):
+    if list(args) == [kFlagSyncFakeRoot]:
+        SyncFakeRoot(buildState.GetTgPath())
+        return 0
+    tracePath = environ.get(kEnvTrace) or None
+    stats = False
+    buildArgs = []
+    for arg in args:
+        if arg.startswith(kFlagTrace + '='):
+            tracePath = arg[len(kFlagTrace) + 1:]
+            assert tracePath, '{}: Path expected.'.format(arg)
+        elif arg == kFlagStats:
+            stats = True
+        else:
+            buildArgs.append(arg)
+    if tracePath is None and not stats:
+        return _RunTgBuild(buildState, buildArgs, callFn, writeFn, environ)
+    StartTrace()
+    try:
+        with Span('tg build'):
+            return _RunTgBuild(buildState, buildArgs, callFn, writeFn,
+                               environ)
+    finally:
+        tracer = StopTrace()
+        if tracePath is not None:
+            tracer.Save(tracePath)
+        if stats:
+            errorFn(tracer.FormatStats())
+
+
+def HandleTgBuild(tgPath, args):
+    sys.exit(RunTgBuild(BuildState(tgPath), args))
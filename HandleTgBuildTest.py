@@ -0,0 +1,469 @@
+# -*- coding: utf-8 -*-
+from FakeRoot import kFakeRootStamp
+from HandleTgBuild import (BuildState, GetPoolDepths, MakeBuildNinja,
+                           PackageFragmentPath, ParseToken,
+                           ReadBuildNinjaHeader, RunTgBuild)
+from HandleTgClean import RunTgClean
+from TargetCache import TargetCache
+from TargetRef import TargetRef
+from TgConfig import TgConfig
+
+import io
+import os
+import pathlib
+import re
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+
+class TgWorkspace:
+    # A Tg environment with a library per package.
+
+    def __init__(self, root, tgroot=''):
+        self.root = root
+        (root / '.tgroot').write_text(tgroot)
+        (root / 'src/.git').mkdir(parents=True)
+        self.buildState = BuildState(root)
+
+    def AddPackage(self, path, targets, files):
+        (self.root / 'src' / path).mkdir(parents=True, exist_ok=True)
+        (self.root / 'src' / path / 'TARGETS').write_text(targets)
+        for name in files:
+            (self.root / 'src' / path / name).write_text('')
+
+    def AddLibrary(self, path, srcs=('x.cc', ), extra=''):
+        self.AddPackage(
+            path, "cc_library(name='x', srcs={!r}{})\n".format(
+                list(srcs), extra), srcs)
+
+    def Build(self, *args, callFn=lambda command: 0):
+        return RunTgBuild(
+            self.buildState,
+            list(args),
+            callFn=callFn,
+            writeFn=lambda text: None,
+            environ={})
+
+    def SyncFakeRootWithNinja(self, command):
+        # Runs ninja for the fake root only, so that no compiler is needed.
+        count = command.index('-C') + 2
+        if command[count:count + 1] == ['-f']:
+            count += 2
+        repoPath = str(pathlib.Path(__file__).resolve().parent)
+        return subprocess.call(
+            command[:count] + [kFakeRootStamp],
+            stdout=subprocess.DEVNULL,
+            env=dict(
+                os.environ,
+                PATH=repoPath + os.pathsep + os.environ.get('PATH', ''),
+                TGPATH=str(self.root),
+                TG_NO_SERVER='1'))
+
+
+class TestMakeBuildNinja(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.workspace = TgWorkspace(pathlib.Path(self.tmpDir.name))
+        self.workspace.AddPackage(
+            'a', "cc_library(name='x', srcs=['x.cc'], headers=['x.h'],"
+            " transitive_compiler_flags=['-DA'])\n", ['x.cc', 'x.h'])
+
+    def tearDown(self):
+        self.tmpDir.cleanup()
+
+    def generate(self, targets, *args):
+        # Returns the manifest for the targets, e.g. ['//a:x'].
+        buildState = self.workspace.buildState
+        buildState.Refresh()
+        targetCache = TargetCache(buildState.GetSrcFs(),
+                                  buildState.GetPersistentCache())
+        targetRefs = [
+            TargetRef(*target.rsplit(':', 1)) for target in sorted(targets)
+        ]
+        ostream = io.StringIO()
+        MakeBuildNinja(self.workspace.root, buildState.GetSrcFs(), targetRefs,
+                       targetCache.MakeTargetPlan(targetRefs), ostream, *args)
+        return ostream.getvalue()
+
+    def fragmentPath(self, path):
+        return self.workspace.root / PackageFragmentPath('.tg/ninja', path)
+
+    def fragment(self, path):
+        return self.fragmentPath(path).read_text()
+
+    def readLinks(self):
+        return (self.workspace.root / '.tg/fake_root.links').read_text()
+
+    def test_Fragments(self):
+        self.workspace.AddLibrary('b', extra=", deps=['//a:x']")
+        manifest = self.generate(['//b:x'])
+        self.assertIn('subninja .tg/ninja/a/.build.ninja\n'
+                      'subninja .tg/ninja/b/.build.ninja\n', manifest)
+        self.assertTrue(self.fragment('//a').startswith('# tg fragment '))
+        self.assertIn('build pkg/a/x.cc.o: cxx_compile src/a/x.cc',
+                      self.fragment('//a'))
+        self.assertIn('build pkg/b/x.cc.o: cxx_compile src/b/x.cc',
+                      self.fragment('//b'))
+        self.assertNotIn('build pkg/a/', manifest)
+
+    def test_FragmentKeys(self):
+        # Only the fragments whose keys changed are rewritten.
+        self.workspace.AddLibrary('b', extra=", deps=['//a:x']")
+        self.workspace.AddLibrary('c')
+
+        def listRewritten():
+            result = []
+            for path in ['//a', '//b', '//c']:
+                realPath = self.fragmentPath(path)
+                if realPath.stat().st_mtime_ns != 0:
+                    result.append(path)
+                os.utime(str(realPath), ns=(0, 0))
+            return result
+
+        self.generate(['//b:x', '//c:x'])
+        listRewritten()
+        self.generate(['//b:x', '//c:x'])
+        self.assertEqual([], listRewritten())
+        self.workspace.AddLibrary('c', srcs=['x.cc', 'y.cc'])
+        self.generate(['//b:x', '//c:x'])
+        self.assertEqual(['//c'], listRewritten())
+        # The dependents of a target inherit its transitive flags.
+        self.workspace.AddPackage(
+            'a', "cc_library(name='x', srcs=['x.cc'],"
+            " transitive_compiler_flags=['-DB'])\n", ['x.cc'])
+        self.generate(['//b:x', '//c:x'])
+        self.assertEqual(['//a', '//b'], listRewritten())
+        self.assertIn('extra_compiler_flags = -DB\n', self.fragment('//b'))
+
+    def test_CompilerFlagsScope(self):
+        # The most common flags of the fragment are its default; the others
+        # are bound once and referred to by name.
+        self.workspace.AddPackage(
+            'b', "cc_library(name='x', srcs=['x1.cc', 'x2.cc'],"
+            " deps=['//a:x'])\n"
+            "cc_library(name='y', srcs=['y.cc'], compiler_flags=['-DY'])\n"
+            "cc_library(name='z', srcs=['z.c'])\n",
+            ['x1.cc', 'x2.cc', 'y.cc', 'z.c'])
+        self.generate(['//b:x', '//b:y', '//b:z'])
+        fragment = self.fragment('//b')
+        self.assertIn('extra_compiler_flags = -DA\n', fragment)
+        self.assertEqual(1, fragment.count('-DY'))
+        self.assertIn(
+            'build pkg/b/x1.cc.o: cxx_compile src/b/x1.cc || pkg/.fake_root\n'
+            '  pkg_in = pkg/b/x1.cc\n', fragment)
+        self.assertRegex(
+            fragment, r'(?m)^(compiler_flags_\d+) = -DY\n(.*\n)*'
+            r'build pkg/b/y.cc.o: .*\n'
+            r'  extra_compiler_flags = \$\1\n')
+        self.assertIn(
+            'build pkg/b/z.c.o: c_compile src/b/z.c || pkg/.fake_root\n'
+            '  extra_compiler_flags = \n', fragment)
+        # The flags of one fragment do not leak into another.
+        self.assertNotIn('-DY', self.fragment('//a'))
+
+    def test_PrecompiledHeader(self):
+        self.workspace.AddPackage(
+            'b', "cc_library(name='x', srcs=['x.cc', 'x.c'],"
+            " headers=['p.h'], precompiled_header='p.h')\n"
+            "cc_library(name='y', srcs=['y.cc'], precompiled_header='p.h')\n"
+            "cc_library(name='z', srcs=['z.cc'], precompiled_header='p.h',"
+            " deps=['//a:x'])\n", ['x.cc', 'x.c', 'y.cc', 'z.cc', 'p.h'])
+        self.generate(['//b:x', '//b:y', '//b:z'])
+        fragment = self.fragment('//b')
+        # A variant per language and set of flags, shared by the targets.
+        pchs = re.findall(r'(?m)^build (pkg/b/p.h.gch/\S+): (\w+) src/b/p.h',
+                          fragment)
+        self.assertEqual(['c_pch', 'cxx_pch', 'cxx_pch'],
+                         sorted(rule for _, rule in pchs))
+        pchOf = dict()
+        for src in ['x.cc', 'x.c', 'y.cc', 'z.cc']:
+            match = re.search(
+                r'build pkg/b/{0}.o: (\w+) src/b/{0} \| (\S+) \|\| '
+                r'pkg/.fake_root\n(  .*\n)*  pch = \2\n'
+                r'  pch_header = pkg/b/p.h\n'.format(re.escape(src)),
+                fragment)
+            self.assertIsNotNone(match, src)
+            self.assertTrue(match.group(1).endswith('_compile_pch'), src)
+            pchOf[src] = match.group(2)
+        self.assertEqual(pchOf['x.cc'], pchOf['y.cc'])
+        self.assertNotEqual(pchOf['x.cc'], pchOf['z.cc'])
+        self.assertNotEqual(pchOf['x.cc'], pchOf['x.c'])
+        self.assertEqual(set(pch for pch, _ in pchs), set(pchOf.values()))
+        self.assertIn('pkg/b/p.h', self.readLinks())
+
+    def test_Unity(self):
+        self.workspace.AddPackage(
+            'b', "cc_library(name='x', srcs=['x1.cc', 'x2.cc', 'x3.cc',"
+            " 'x4.c'])\n"
+            "cc_library(name='y', srcs=['y1.cc', 'y2.cc'],"
+            " unity_build=False)\n", ['x1.cc', 'x2.cc', 'x3.cc', 'x4.c',
+                                       'y1.cc', 'y2.cc'])
+        manifest = self.generate(['//b:x', '//b:y'], 2)
+        self.assertIn('  build_flags = --unity=2\n', manifest)
+        fragment = self.fragment('//b')
+        root = self.workspace.root
+        # Groups of up to two sources of the same language; a source alone
+        # in its group is compiled as usual.
+        self.assertEqual(
+            '// Generated by tg.\n'
+            '#include "../../../pkg/b/x1.cc"\n'
+            '#include "../../../pkg/b/x2.cc"\n',
+            (root / '.tg/unity/b/x-0.cc').read_text())
+        self.assertFalse((root / '.tg/unity/b/x-1.cc').exists())
+        self.assertIn(
+            'build pkg/b/.unity/x-0.cc.o: cxx_compile .tg/unity/b/x-0.cc'
+            ' || pkg/.fake_root\n'
+            '  pkg_in = .tg/unity/b/x-0.cc\n', fragment)
+        self.assertIn(
+            'build pkg/b/x.a: ar pkg/b/.unity/x-0.cc.o pkg/b/x3.cc.o'
+            ' pkg/b/x4.c.o\n', fragment)
+        self.assertIn('build pkg/b/y.a: ar pkg/b/y1.cc.o pkg/b/y2.cc.o\n',
+                      fragment)
+        # Unchanged unity sources are not rewritten.
+        inode = (root / '.tg/unity/b/x-0.cc').stat().st_ino
+        self.generate(['//b:x', '//b:y'], 2)
+        self.assertEqual(inode, (root / '.tg/unity/b/x-0.cc').stat().st_ino)
+        # Without unity builds the sources are compiled one by one.
+        self.generate(['//b:x', '//b:y'])
+        self.assertNotIn('.unity', self.fragment('//b'))
+
+    def test_Pools(self):
+        self.workspace.AddPackage(
+            'b', "cc_library(name='x', srcs=['x.cc'], heavy_compile=True)\n"
+            "cc_binary(name='m', srcs=['m.cc'], deps=[':x'])\n",
+            ['x.cc', 'm.cc'])
+        manifest = self.generate(
+            ['//b:m'], None, None, (('link_pool', 2), ('heavy_compile', 3)))
+        self.assertIn('pool link_pool\n  depth = 2\n', manifest)
+        self.assertIn('pool heavy_compile\n  depth = 3\n', manifest)
+        self.assertRegex(manifest,
+                         r'rule cxx_link\n(  .*\n)*  pool = link_pool\n')
+        fragment = self.fragment('//b')
+        self.assertIn(
+            'build pkg/b/x.cc.o: cxx_compile src/b/x.cc || pkg/.fake_root\n'
+            '  pkg_in = pkg/b/x.cc\n'
+            '  pool = heavy_compile\n', fragment)
+        self.assertIn(
+            'build pkg/b/m.cc.o: cxx_compile src/b/m.cc || pkg/.fake_root\n'
+            '  pkg_in = pkg/b/m.cc\n'
+            'build bin/b/m:', fragment)
+        # Depths are not a part of the fragments.
+        self.assertNotIn('depth', fragment)
+
+    def test_PoolDepths(self):
+        config = TgConfig({
+            'link_pool_depth': 2,
+            'heavy_compile_pool_depth': 3
+        })
+        self.assertEqual((('link_pool', 2), ('heavy_compile', 3)),
+                         GetPoolDepths(config, {}))
+        self.assertEqual((('link_pool', 2), ('heavy_compile', 5)),
+                         GetPoolDepths(config, {
+                             'TG_HEAVY_COMPILE_POOL_DEPTH': '5'
+                         }))
+        with self.assertRaises(AssertionError):
+            GetPoolDepths(config, {'TG_LINK_POOL_DEPTH': '0'})
+        with self.assertRaises(AssertionError):
+            GetPoolDepths(config, {'TG_LINK_POOL_DEPTH': 'x'})
+
+    def test_Archives(self):
+        self.workspace.AddPackage(
+            'b', "cc_library(name='x', srcs=['x1.cc', 'x2.cc'],"
+            " deps=['//a:x'])\n"
+            "cc_binary(name='m', srcs=['m.cc'], deps=[':x'])\n",
+            ['x1.cc', 'x2.cc', 'm.cc'])
+        manifest = self.generate(['//b:m'])
+        # Inputs of archives and links are passed in response files.
+        for rule in ['ar', 'cxx_link']:
+            self.assertRegex(
+                manifest, r'rule {}\n  command = .*\$out.rsp.*\n(  .*\n)*'
+                r'  rspfile = \$out.rsp\n'
+                r'  rspfile_content = \$in\n'.format(rule))
+        if os.uname().sysname != 'Darwin':
+            self.assertIn('ar_flags = crsT\n', manifest)
+        fragment = self.fragment('//b')
+        self.assertIn('build pkg/b/x.a: ar pkg/b/x1.cc.o pkg/b/x2.cc.o\n',
+                      fragment)
+        self.assertIn(
+            'build bin/b/m: cxx_link pkg/b/m.cc.o pkg/b/x.a pkg/a/x.a\n',
+            fragment)
+        # With link_objects the objects of the libraries are linked.
+        self.generate(['//b:m'], None, None, None, True)
+        self.assertIn(
+            'build bin/b/m: cxx_link pkg/b/m.cc.o pkg/b/x1.cc.o'
+            ' pkg/b/x2.cc.o pkg/a/x.cc.o\n', self.fragment('//b'))
+
+
+class TestBuildConfigs(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.workspace = TgWorkspace(
+            pathlib.Path(self.tmpDir.name),
+            "configs = {'dbg': {'compiler_flags': ['-O0']}}\n")
+        self.workspace.AddLibrary('a')
+        self.commands = []
+
+    def tearDown(self):
+        self.tmpDir.cleanup()
+
+    def record(self, command):
+        self.commands.append(command)
+        return 0
+
+    def build(self, *args):
+        return self.workspace.Build(*args, callFn=self.record)
+
+    def read(self, path):
+        return (self.workspace.root / path).read_text()
+
+    def test_Outputs(self):
+        root = self.workspace.root
+        self.assertEqual(0, self.build('//a:x'))
+        self.assertEqual(0, self.build('--config=dbg', '//a:x'))
+        self.assertEqual([
+            ['ninja', '-C', str(root)],
+            ['ninja', '-C', str(root), '-f', 'build-dbg.ninja'],
+        ], self.commands)
+        self.assertTrue((root / '.tg/build.fingerprint').exists())
+        self.assertTrue((root / '.tg/build-dbg.fingerprint').exists())
+        self.assertIn('builddir = .\n', self.read('build.ninja'))
+        self.assertIn('builddir = out/dbg\n', self.read('build-dbg.ninja'))
+        self.assertNotIn('-O0', self.read('build.ninja'))
+        self.assertIn('-O0', self.read('build-dbg.ninja'))
+        self.assertIn('build pkg/a/x.a:',
+                      self.read('.tg/ninja/a/.build.ninja'))
+        self.assertIn('build out/dbg/pkg/a/x.a:',
+                      self.read('.tg/ninja-dbg/a/.build.ninja'))
+
+    def test_SameManifest(self):
+        # Building another configuration keeps the manifest of the first one.
+        self.assertEqual(0, self.build('//a:x'))
+        manifest = self.read('build.ninja')
+        self.assertEqual(0, self.build('--config=dbg', '//a:x'))
+        self.assertEqual(0, self.build('//a:x'))
+        self.assertEqual(manifest, self.read('build.ninja'))
+
+    def test_Clean(self):
+        root = self.workspace.root
+        self.build('//a:x')
+        self.build('--config=dbg', '//a:x')
+        self.assertEqual(
+            0, RunTgClean(root, ['--config=dbg'], callFn=self.record))
+        self.assertEqual(
+            ['ninja', '-C', str(root), '-f', 'build-dbg.ninja', '-t', 'clean'],
+            self.commands[-1])
+        self.assertFalse((root / 'build-dbg.ninja').exists())
+        self.assertFalse((root / '.tg/build-dbg.fingerprint').exists())
+        self.assertTrue((root / 'build.ninja').exists())
+
+    def test_Invalid(self):
+        with self.assertRaises(AssertionError):
+            self.build('--config=missing', '//a:x')
+        with self.assertRaises(AssertionError):
+            self.build('--config=', '//a:x')
+        self.assertEqual([], self.commands)
+
+
+class TestCumulativeManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.workspace = TgWorkspace(pathlib.Path(self.tmpDir.name))
+        self.workspace.AddLibrary('a')
+        self.workspace.AddLibrary('b', extra=", deps=['//a:x']")
+        self.workspace.AddLibrary('c')
+        self.commands = []
+
+    def tearDown(self):
+        self.tmpDir.cleanup()
+
+    def build(self, *args):
+        def callFn(command):
+            self.commands.append(command[3:])
+            return 0
+
+        self.assertEqual(0, self.workspace.Build(*args, callFn=callFn))
+        return self.commands[-1]
+
+    def listManifestTargets(self):
+        return [
+            str(targetRef) for targetRef in ParseToken(
+                ReadBuildNinjaHeader(self.workspace.root)[0])
+        ]
+
+    def test_Union(self):
+        self.assertEqual([], self.build('//b:x'))
+        self.assertEqual(['//b:x'], self.listManifestTargets())
+        self.assertEqual(['target/c:x'], self.build('//c:x'))
+        self.assertEqual(['//b:x', '//c:x'], self.listManifestTargets())
+        manifest = (self.workspace.root / 'build.ninja').read_text()
+        # The targets of the manifest need no ninja training.
+        self.assertEqual(['target/b:x'], self.build('//b:x'))
+        self.assertEqual([], self.build('//b:x', '//c:x'))
+        self.assertEqual(manifest,
+                         (self.workspace.root / 'build.ninja').read_text())
+
+    def test_DroppedTarget(self):
+        self.build('//a:x')
+        self.build('//b:x')
+        self.build('//c:x')
+        shutil.rmtree(str(self.workspace.root / 'src/c'))
+        self.assertEqual(['target/b:x'], self.build('//b:x'))
+        self.assertEqual(['//a:x', '//b:x'], self.listManifestTargets())
+
+    def test_Fallback(self):
+        # A previous target that no longer plans does not break the build.
+        self.build('//b:x')
+        self.workspace.AddLibrary('b', extra=", deps=['//missing:x']")
+        self.assertEqual([], self.build('//c:x'))
+        self.assertEqual(['//c:x'], self.listManifestTargets())
+
+    def test_PhonyTargets(self):
+        self.build('//b:x')
+        root = self.workspace.root
+        self.assertIn('build target/a$:x: phony pkg/a/x.a\n',
+                      (root / '.tg/ninja/a/.build.ninja').read_text())
+        self.assertIn('build target/b$:x: phony pkg/b/x.a target/a$:x\n',
+                      (root / '.tg/ninja/b/.build.ninja').read_text())
+
+    def test_Clean(self):
+        # tg clean forgets the targets of previous builds.
+        self.build('//b:x')
+        self.build('//c:x')
+        self.assertEqual(0, RunTgClean(self.workspace.root, [],
+                                       callFn=lambda command: 0))
+        self.assertFalse((self.workspace.root / 'build.ninja').exists())
+        self.assertEqual([], self.build('//c:x'))
+        self.assertEqual(['//c:x'], self.listManifestTargets())
+
+
+@unittest.skipUnless(shutil.which('ninja'), 'ninja is required')
+class TestBuildConfigIsolation(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.workspace = TgWorkspace(
+            pathlib.Path(self.tmpDir.name),
+            "configs = {'dbg': {'compiler_flags': ['-O0']}}\n")
+        self.workspace.AddLibrary('a')
+        self.workspace.AddLibrary('b')
+
+    def tearDown(self):
+        self.tmpDir.cleanup()
+
+    def test_SwitchConfigs(self):
+        callFn = self.workspace.SyncFakeRootWithNinja
+        root = self.workspace.root
+        self.assertEqual(0, self.workspace.Build('//a:x', callFn=callFn))
+        self.assertTrue((root / 'pkg/a/x.cc').is_symlink())
+        self.assertEqual(
+            0, self.workspace.Build('--config=dbg', '//b:x', callFn=callFn))
+        self.assertTrue((root / 'pkg/b/x.cc').is_symlink())
+        # The untouched target of the default configuration still has its
+        # sources, even though its fake root is up to date for ninja.
+        self.assertEqual(0, self.workspace.Build('//a:x', callFn=callFn))
+        self.assertTrue((root / 'pkg/a/x.cc').is_symlink())
+
+
+if __name__ == '__main__':
+    unittest.main()
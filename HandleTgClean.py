@@ -2,7 +2,42 @@
 import subprocess
 import sys
 
+from BuildConfig import BuildConfig, ParseConfigName, kFlagConfig
+from FakeRoot import RemoveFakeRoot
+from TgConfig import TgConfig
+
+
+def RemoveBuildNinja(tgPath, buildConfig):
+    # The manifest records the targets of all builds since it was created,
+    # so removing it makes the next build start over from the requested
+    # targets.
+    for path in [
+            buildConfig.GetBuildNinja(),
+            buildConfig.GetFingerprintFile(),
+            buildConfig.GetFakeRootLinksFile()
+    ]:
+        if (tgPath / path).exists():
+            (tgPath / path).unlink()
+
+
+def RunTgClean(tgPath, args, callFn=subprocess.call):
+    # tg clean removes the outputs, the fake root and build.ninja with the
+    # targets it has recorded. tg clean --config=NAME removes the outputs and
+    # the manifest of the configuration only.
+    if not args:
+        buildConfig = BuildConfig()
+    else:
+        assert len(args) == 1 and args[0].startswith(
+            kFlagConfig + '='), "tg clean: Unexpected arguments."
+        buildConfig = BuildConfig.Load(
+            TgConfig.Load(tgPath), ParseConfigName(args[0]))
+    exitCode = callFn(buildConfig.MakeNinjaCommand(tgPath) + ['-t', 'clean'])
+    RemoveBuildNinja(tgPath, buildConfig)
+    if buildConfig.GetName() is None:
+        # The links of the fake root are not outputs of ninja edges.
+        RemoveFakeRoot(tgPath)
+    return exitCode
+
 
 def HandleTgClean(tgPath, args):
-    assert not args, "tg clean: Unexpected arguments."
-    sys.exit(subprocess.call(['ninja', '-C', str(tgPath), '-t', 'clean']))
+    sys.exit(RunTgClean(tgPath, args))
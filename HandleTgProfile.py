@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+
+# tg profile: where the time of the last build went. The actions recorded in
+# .ninja_log are mapped back to the targets of build.ninja by the names of
+# their outputs. The report shows the dependency levels of the plan, the
+# critical path through the target graph, the time spent on every target and
+# the slowest compilations:
+#
+#   tg profile [--config=NAME] [--top=N] [--chrome-trace=FILE]
+#
+# The trace file can be opened in chrome://tracing or Perfetto.
+
+import collections
+import heapq
+import json
+import sys
+
+import CCTargets
+from BuildConfig import BuildConfig, ParseConfigName, kFlagConfig
+from HandleTgBuild import (BuildState, IsCompiledFile, ParseToken,
+                           ReadBuildNinjaHeader, ccBin, ccBinSymlink, ccLib,
+                           ccObj)
+from NinjaLog import LoadLastNinjaRun
+from PlanLevels import PlanLevels
+from TargetCache import TargetCache
+from TargetRef import TargetRef
+
+kFlagTop = '--top'
+kFlagChromeTrace = '--chrome-trace'
+kDefaultTop = 10
+
+kCompile = 'compile'
+kLink = 'link'
+
+
+class OutputMap:
+    # Maps outputs of ninja edges to the targets and the kinds of actions
+    # producing them. Outputs of named configurations start with outDir.
+
+    def __init__(self, targetPlan, outDir=''):
+        self.__targetPlan = targetPlan
+        self.__outDir = outDir
+        self.__outputs = dict()
+        self.__pchDirs = dict()
+        for targetRef, target in targetPlan.items():
+            for src in target.GetSrcs():
+                if IsCompiledFile(src):
+                    self.__outputs[ccObj(src)] = (targetRef, kCompile)
+            if isinstance(target, CCTargets.CCLibrary):
+                self.__outputs[ccLib(targetRef)] = (targetRef, kLink)
+            elif isinstance(target, CCTargets.CCBinary):
+                self.__outputs[ccBin(targetRef)] = (targetRef, kLink)
+                self.__outputs[ccBinSymlink(targetRef)] = (targetRef, kLink)
+            precompiledHeader = target.GetPrecompiledHeader()
+            if precompiledHeader is not None:
+                self.__pchDirs.setdefault(
+                    'pkg' + precompiledHeader[1:] + '.gch', targetRef)
+
+    def Get(self, output):
+        # Returns (targetRef, kind), or None for actions of tg itself.
+        if not output.startswith(self.__outDir):
+            return None
+        output = output[len(self.__outDir):]
+        result = self.__outputs.get(output)
+        if result is not None:
+            return result
+        dir, name = output.rsplit('/', 1) if '/' in output else ('', output)
+        if dir.endswith('/.unity') and dir.startswith('pkg/'):
+            # See ccUnityObj().
+            targetRef = TargetRef(
+                path='/' + dir[len('pkg'):-len('/.unity')],
+                name=name.rsplit('-', 1)[0])
+            if targetRef in self.__targetPlan:
+                return targetRef, kCompile
+        elif dir in self.__pchDirs:
+            return self.__pchDirs[dir], kCompile
+        return None
+
+
+def FindCriticalPath(targetPlan, weights):
+    # Returns the heaviest chain of dependencies. Targets of the plan follow
+    # their dependencies.
+    finish = dict()
+    parents = dict()
+    for targetRef, target in targetPlan.items():
+        parent = None
+        for depRef in target.GetDeps():
+            if parent is None or finish[depRef] > finish[parent]:
+                parent = depRef
+        finish[targetRef] = weights.get(targetRef, 0) + (
+            finish[parent] if parent is not None else 0)
+        parents[targetRef] = parent
+    result = []
+    targetRef = max(finish, key=finish.get) if finish else None
+    while targetRef is not None:
+        result.append(targetRef)
+        targetRef = parents[targetRef]
+    result.reverse()
+    return result
+
+
+def MakeChromeTrace(entries, outputMap):
+    # Actions running at once are laid out on separate lanes.
+    events = []
+    lanes = []
+    freeLanes = []
+    for entry in sorted(entries):
+        while lanes and lanes[0][0] <= entry.start:
+            heapq.heappush(freeLanes, heapq.heappop(lanes)[1])
+        lane = heapq.heappop(freeLanes) if freeLanes else len(lanes)
+        heapq.heappush(lanes, (entry.end, lane))
+        mapped = outputMap.Get(entry.output)
+        events.append({
+            'name': entry.output,
+            'cat': mapped[1] if mapped else 'tg',
+            'ph': 'X',
+            'ts': entry.start * 1000,
+            'dur': (entry.end - entry.start) * 1000,
+            'pid': 0,
+            'tid': lane,
+            'args': {
+                'target': str(mapped[0])
+            } if mapped else {},
+        })
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def FormatSeconds(ms):
+    return '{:.2f}s'.format(ms / 1000.0)
+
+
+def RunTgProfile(tgPath, args, writeFn=sys.stdout.write):
+    top = kDefaultTop
+    chromeTracePath = None
+    configName = None
+    for arg in args:
+        if arg.startswith(kFlagConfig + '='):
+            configName = ParseConfigName(arg)
+        elif arg.startswith(kFlagTop + '='):
+            value = arg[len(kFlagTop) + 1:]
+            assert value.isdigit(), '{}: Invalid number.'.format(arg)
+            top = int(value)
+        elif arg.startswith(kFlagChromeTrace + '='):
+            chromeTracePath = arg[len(kFlagChromeTrace) + 1:]
+        else:
+            assert False, '{}: Unexpected argument.'.format(arg)
+    buildState = BuildState(tgPath)
+    buildState.Refresh()
+    buildConfig = BuildConfig()
+    if configName is not None:
+        buildConfig = BuildConfig.Load(buildState.GetConfig(), configName)
+    entries = LoadLastNinjaRun(tgPath / buildConfig.GetBuildDir())
+    assert entries, 'tg profile: No build to profile; run tg build first.'
+    targetCache = TargetCache(buildState.GetSrcFs(),
+                              buildState.GetPersistentCache())
+    targetRefs = ParseToken(
+        ReadBuildNinjaHeader(tgPath, buildConfig.GetBuildNinja())[0])
+    assert targetRefs, (
+        'tg profile: No build.ninja to profile; run tg build first.')
+    targetPlan = targetCache.MakeTargetPlan(targetRefs)
+    targetCache.Save()
+    outputMap = OutputMap(targetPlan, buildConfig.GetOutDir())
+
+    totals = collections.defaultdict(lambda: {kCompile: 0, kLink: 0})
+    longestCompiles = collections.defaultdict(int)
+    compileCounts = collections.defaultdict(int)
+    compiles = []
+    otherTime = 0
+    for entry in entries:
+        duration = entry.end - entry.start
+        mapped = outputMap.Get(entry.output)
+        if mapped is None:
+            otherTime += duration
+            continue
+        targetRef, kind = mapped
+        totals[targetRef][kind] += duration
+        if kind == kCompile:
+            longestCompiles[targetRef] = max(longestCompiles[targetRef],
+                                             duration)
+            compileCounts[targetRef] += 1
+            compiles.append((duration, entry.output, targetRef))
+
+    # With enough parallelism a target takes as long as its longest
+    # compilation followed by archiving or linking.
+    weights = {
+        targetRef: longestCompiles[targetRef] + total[kLink]
+        for targetRef, total in totals.items()
+    }
+    criticalPath = FindCriticalPath(targetPlan, weights)
+
+    wallTime = max(entry.end for entry in entries) - min(
+        entry.start for entry in entries)
+    writeFn('Last build: {} actions, {} wall time, {} in actions ({} in tg '
+            'actions).\n'.format(
+                len(entries),
+                FormatSeconds(wallTime),
+                FormatSeconds(sum(entry.end - entry.start
+                                  for entry in entries)),
+                FormatSeconds(otherTime)))
+    planLevels = PlanLevels(targetPlan)
+    writeFn('\nPlan: {} targets in {} levels, at most {} at once.\n'.format(
+        len(targetPlan), len(planLevels.GetWavefronts()),
+        planLevels.GetMaxParallelism()))
+    writeFn('  Targets per level: {}\n'.format(' '.join(
+        str(len(wavefront)) for wavefront in planLevels.GetWavefronts())))
+    writeFn('  Longest chain: {}\n'.format(' -> '.join(
+        str(targetRef) for targetRef in planLevels.GetLongestChain())))
+    bottlenecks = planLevels.GetBottlenecks()
+    if bottlenecks:
+        writeFn('  Alone in their levels: {}\n'.format(' '.join(
+            str(targetRef) for targetRef in bottlenecks)))
+    writeFn('\nCritical path ({}):\n'.format(
+        FormatSeconds(sum(weights.get(targetRef, 0)
+                          for targetRef in criticalPath))))
+    for targetRef in criticalPath:
+        writeFn('  {:>9}  {}\n'.format(
+            FormatSeconds(weights.get(targetRef, 0)), targetRef))
+    writeFn('\nTargets:\n  {:>9}  {:>9}  {:>5}\n'.format(
+        'compile', 'link', 'units'))
+    for targetRef, total in sorted(
+            totals.items(),
+            key=lambda item: (-item[1][kCompile] - item[1][kLink],
+                              item[0]))[:top]:
+        writeFn('  {:>9}  {:>9}  {:>5}  {}\n'.format(
+            FormatSeconds(total[kCompile]),
+            FormatSeconds(total[kLink]), compileCounts[targetRef],
+            targetRef))
+    writeFn('\nSlowest compilations:\n')
+    for duration, output, targetRef in sorted(
+            compiles, key=lambda item: (-item[0], item[1]))[:top]:
+        writeFn('  {:>9}  {}  {}\n'.format(
+            FormatSeconds(duration), output, targetRef))
+
+    if chromeTracePath is not None:
+        with open(chromeTracePath, 'w', encoding='utf-8') as ostream:
+            json.dump(MakeChromeTrace(entries, outputMap), ostream)
+    return 0
+
+
+def HandleTgProfile(tgPath, args):
+    sys.exit(RunTgProfile(tgPath, args))
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import traceback
+
+from HandleTgBuild import BuildState, RunTgBuild
+from HandleTgClean import RunTgClean
+from TgServerClient import (Connect, RecvExactly, SendFrame, kEnvNoServer,
+                            kFrameExit, kFrameHeader, kFrameStderr,
+                            kFrameStdout, kServerSocketFile)
+
+kServerLogFile = '.tg/server.log'
+
+
+class _Server:
+    def __init__(self, tgPath):
+        self.__tgPath = tgPath
+        self.__buildState = BuildState(tgPath)
+
+    def _Call(self, connection, env, args):
+        process = subprocess.Popen(
+            args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env)
+        try:
+            for chunk in iter(lambda: process.stdout.read1(65536), b''):
+                SendFrame(connection, kFrameStdout, chunk)
+        except OSError:
+            # The client is gone; there is nobody to build for.
+            process.terminate()
+        process.stdout.close()
+        return process.wait()
+
+    def _Handle(self, connection):
+        with connection.makefile('rb') as istream:
+            request = json.loads(istream.readline().decode('utf-8'))
+        if request['command'] == 'stop':
+            SendFrame(connection, kFrameExit, b'0')
+            return False
+        env = dict(request['env'])
+        env[kEnvNoServer] = '1'
+        callFn = lambda args: self._Call(connection, env, args)
+        try:
+            os.chdir(request['cwd'])
+            if request['command'] == 'build':
+                exitCode = RunTgBuild(
+                    self.__buildState, request['args'], callFn,
+                    lambda text: SendFrame(connection, kFrameStdout,
+                                           text.encode('utf-8')), env,
+                    lambda text: SendFrame(connection, kFrameStderr,
+                                           text.encode('utf-8')))
+            elif request['command'] == 'clean':
+                exitCode = RunTgClean(self.__tgPath, request['args'], callFn)
+            else:
+                assert False, '{}: Unknown command.'.format(
+                    request['command'])
+        except Exception:
+            SendFrame(connection, kFrameStderr,
+                       traceback.format_exc().encode('utf-8'))
+            exitCode = 1
+        SendFrame(connection, kFrameExit, str(exitCode).encode('utf-8'))
+        return True
+
+    def Run(self):
+        socketPath = self.__tgPath / kServerSocketFile
+        socketPath.parent.mkdir(parents=True, exist_ok=True)
+        connection = Connect(self.__tgPath)
+        if connection is not None:
+            connection.close()
+            raise RuntimeError('tg server: Already running.')
+        if socketPath.exists():
+            socketPath.unlink()
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            listener.bind(str(socketPath))
+            listener.listen()
+            running = True
+            while running:
+                connection, _ = listener.accept()
+                with connection:
+                    try:
+                        running = self._Handle(connection)
+                    except OSError:
+                        pass
+        finally:
+            listener.close()
+            socketPath.unlink()
+
+
+def HandleTgServer(tgPath, args):
+    assert len(args) == 1 and args[0] in (
+        'run', 'start', 'stop'), 'tg server: run, start or stop is expected.'
+    if args[0] == 'run':
+        _Server(tgPath).Run()
+    elif args[0] == 'start':
+        (tgPath / kServerLogFile).parent.mkdir(parents=True, exist_ok=True)
+        with (tgPath / kServerLogFile).open('ab') as log:
+            subprocess.Popen(
+                [sys.executable, os.path.abspath(sys.argv[0]), 'server', 'run'],
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=log,
+                start_new_session=True)
+    else:
+        connection = Connect(tgPath)
+        assert connection is not None, 'tg server: Not running.'
+        with connection:
+            connection.sendall(json.dumps({'command': 'stop'}).encode('utf-8')
+                               + b'\n')
+            RecvExactly(connection, kFrameHeader.size)
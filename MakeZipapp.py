@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Packs tg into a single executable file with precompiled bytecode:
+#
+#   ./MakeZipapp.py [--output=tg.pyz] [--python='/usr/bin/env python3']
+
+import argparse
+import os
+import pathlib
+import py_compile
+import stat
+import tempfile
+import zipfile
+
+kMainModule = 'import main\nmain.main()\n'
+
+
+def ListModules(srcDir):
+    return sorted(
+        path for path in srcDir.glob('*.py')
+        if not path.stem.endswith(('Test', 'Bench')) and
+        path.stem != 'MakeZipapp')
+
+
+def MakeZipapp(srcDir, outputPath, interpreter):
+    tmpPath = outputPath.with_name(outputPath.name + '.tmp')
+    with tempfile.TemporaryDirectory() as tmpDir:
+        with tmpPath.open('wb') as ostream:
+            ostream.write('#!{}\n'.format(interpreter).encode('utf-8'))
+            with zipfile.ZipFile(ostream, 'w',
+                                 zipfile.ZIP_DEFLATED) as archive:
+                archive.writestr('__main__.py', kMainModule)
+                for modulePath in ListModules(srcDir):
+                    # Unchecked hash-based .pyc files are used by zipimport
+                    # as is; the sources are kept for tracebacks.
+                    pycPath = pathlib.Path(tmpDir) / (modulePath.stem + '.pyc')
+                    py_compile.compile(
+                        str(modulePath),
+                        cfile=str(pycPath),
+                        dfile=modulePath.name,
+                        doraise=True,
+                        invalidation_mode=py_compile.PycInvalidationMode.
+                        UNCHECKED_HASH)
+                    archive.write(str(modulePath), modulePath.name)
+                    archive.write(str(pycPath), pycPath.name)
+    tmpPath.chmod(tmpPath.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP |
+                  stat.S_IXOTH)
+    os.replace(str(tmpPath), str(outputPath))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', default='tg.pyz')
+    parser.add_argument('--python', default='/usr/bin/env python3')
+    args = parser.parse_args()
+    MakeZipapp(
+        pathlib.Path(__file__).resolve().parent,
+        pathlib.Path(args.output), args.python)
+
+
+if __name__ == '__main__':
+    main()
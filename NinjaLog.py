@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+# Reader of `.ninja_log`. Every line after the version header records an
+# action finished by ninja:
+#
+#   <start ms>\t<end ms>\t<mtime>\t<output>\t<command hash>
+#
+# Times are relative to the start of the ninja run. The order of the lines
+# says nothing about the runs: `ninja -t restat` and the recompaction of the
+# log rewrite it in the order of a hash table. Instead, tg build touches
+# kNinjaStartFile next to the log right before it runs ninja, and the actions
+# of that run are the ones whose mtime is not older than the file. Ninja
+# records the start of the command as the mtime, read from the file system
+# clock like the mtime of the file.
+
+import collections
+import os
+
+kNinjaLogFile = '.ninja_log'
+kNinjaStartFile = '.ninja_log.start'
+kNinjaNextStartFile = '.ninja_log.start.next'
+
+NinjaLogEntry = collections.namedtuple(
+    'NinjaLogEntry', ['start', 'end', 'mtime', 'output', 'commandHash'])
+
+
+def ParseNinjaLog(text):
+    # Returns the entries of the log, one per output, in no particular order.
+    lines = text.split('\n')
+    assert lines[0].startswith('# ninja log v'), (
+        '{}: Unknown format.'.format(kNinjaLogFile))
+    entries = []
+    for line in lines[1:]:
+        fields = line.split('\t')
+        if len(fields) != 5:
+            continue
+        entries.append(
+            NinjaLogEntry(
+                int(fields[0]), int(fields[1]), int(fields[2]), fields[3],
+                fields[4]))
+    return entries
+
+
+def SelectNinjaRun(entries, startMtime):
+    # Returns the entries of the run started at startMtime in the order they
+    # finished. Outputs of a multi-output action share one entry.
+    result = []
+    seen = set()
+    for entry in sorted(
+            entries, key=lambda entry: (entry.end, entry.start, entry.output)):
+        key = (entry.start, entry.end, entry.commandHash)
+        if entry.mtime < startMtime or key in seen:
+            continue
+        seen.add(key)
+        result.append(entry)
+    return result
+
+
+def _StatNinjaLog(buildDir):
+    try:
+        stat = (buildDir / kNinjaLogFile).stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def StartNinjaRun(buildDir):
+    # Returns the state of the log to pass to FinishNinjaRun().
+    buildDir.mkdir(parents=True, exist_ok=True)
+    (buildDir / kNinjaNextStartFile).touch()
+    return _StatNinjaLog(buildDir)
+
+
+def FinishNinjaRun(buildDir, logState):
+    # A run that recorded nothing, e.g. since there was nothing to do, keeps
+    # the start of the previous one, so that tg profile reports the last
+    # build that did something.
+    if _StatNinjaLog(buildDir) != logState:
+        os.replace(
+            str(buildDir / kNinjaNextStartFile),
+            str(buildDir / kNinjaStartFile))
+
+
+def LoadLastNinjaRun(buildDir):
+    # Returns the entries of the last run started by tg build, or an empty
+    # list if there is none.
+    try:
+        startMtime = (buildDir / kNinjaStartFile).stat().st_mtime_ns
+        text = (buildDir / kNinjaLogFile).read_text(encoding='utf-8')
+    except FileNotFoundError:
+        return []
+    return SelectNinjaRun(ParseNinjaLog(text), startMtime)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+from NinjaLog import (FinishNinjaRun, LoadLastNinjaRun, NinjaLogEntry,
+                      ParseNinjaLog, SelectNinjaRun, StartNinjaRun,
+                      kNinjaLogFile, kNinjaStartFile)
+
+import os
+import pathlib
+import random
+import tempfile
+import unittest
+
+# Two runs: the first one built a.o, b.o and the headers x.h and y.h of a
+# multi-output action, the second one at mtime 200 rebuilt a.o and c.o.
+kLines = [
+    '0\t10\t100\ta.o\t1',
+    '5\t20\t100\tb.o\t2',
+    '0\t7\t100\tx.h\t4',
+    '0\t7\t100\ty.h\t4',
+    '1\t3\t200\ta.o\t3',
+    '2\t4\t201\tc.o\t5',
+    '2\t4\t201\td.o\t5',
+]
+
+
+class TestNinjaLog(unittest.TestCase):
+    def test_Parse(self):
+        self.assertEqual([
+            NinjaLogEntry(0, 10, 100, 'a.o', '1'),
+            NinjaLogEntry(5, 20, 100, 'b.o', '2'),
+        ], ParseNinjaLog('# ninja log v5\n' + '\n'.join(kLines[:2]) + '\n'))
+
+    def test_SelectRun(self):
+        entries = ParseNinjaLog('# ninja log v7\n' + '\n'.join(kLines))
+        self.assertEqual([
+            NinjaLogEntry(1, 3, 200, 'a.o', '3'),
+            NinjaLogEntry(2, 4, 201, 'c.o', '5'),
+        ], SelectNinjaRun(entries, 200))
+        self.assertEqual([
+            NinjaLogEntry(1, 3, 200, 'a.o', '3'),
+            NinjaLogEntry(2, 4, 201, 'c.o', '5'),
+            NinjaLogEntry(0, 7, 100, 'x.h', '4'),
+            NinjaLogEntry(0, 10, 100, 'a.o', '1'),
+            NinjaLogEntry(5, 20, 100, 'b.o', '2'),
+        ], SelectNinjaRun(entries, 0))
+
+    def test_Shuffled(self):
+        # `ninja -t restat` and recompaction rewrite the log in hash order.
+        lines = list(kLines)
+        expected = SelectNinjaRun(
+            ParseNinjaLog('# ninja log v7\n' + '\n'.join(lines)), 200)
+        for seed in range(10):
+            random.Random(seed).shuffle(lines)
+            self.assertEqual(expected,
+                             SelectNinjaRun(
+                                 ParseNinjaLog('# ninja log v7\n' +
+                                               '\n'.join(lines)), 200))
+
+    def test_LoadLastNinjaRun(self):
+        with tempfile.TemporaryDirectory() as tmpDir:
+            buildDir = pathlib.Path(tmpDir)
+            logPath = buildDir / kNinjaLogFile
+            self.assertEqual([], LoadLastNinjaRun(buildDir))
+            logPath.write_text('# ninja log v7\n' + '\n'.join(kLines[:4]) +
+                               '\n')
+            # The log of runs not started by tg build.
+            self.assertEqual([], LoadLastNinjaRun(buildDir))
+            logState = StartNinjaRun(buildDir)
+            with logPath.open('a') as ostream:
+                ostream.write('\n'.join(kLines[4:]) + '\n')
+            FinishNinjaRun(buildDir, logState)
+            os.utime(str(buildDir / kNinjaStartFile), ns=(200, 200))
+            self.assertEqual(['a.o', 'c.o'], [
+                entry.output for entry in LoadLastNinjaRun(buildDir)
+            ])
+            # A run that recorded nothing keeps the previous one.
+            FinishNinjaRun(buildDir, StartNinjaRun(buildDir))
+            self.assertEqual(['a.o', 'c.o'], [
+                entry.output for entry in LoadLastNinjaRun(buildDir)
+            ])
+
+    def test_Empty(self):
+        self.assertEqual([], ParseNinjaLog('# ninja log v7\n'))
+
+    def test_UnknownFormat(self):
+        with self.assertRaises(AssertionError):
+            ParseNinjaLog('garbage\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
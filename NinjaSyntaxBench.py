@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Compares ninja_syntax.Writer and ninja_syntax.FastWriter on the calls tg
+# makes to generate a synthetic plan:
+#
+#   ./NinjaSyntaxBench.py [--targets=20000] [--repeat=3]
+
+import argparse
+import pathlib
+import tempfile
+import time
+
+import CCTargets
+import DepsClosureBench
+import HandleTgBuild
+import ninja_syntax
+from DepsClosure import DepsClosure
+from SrcFs import SrcFs
+
+
+class _RecordingWriter:
+    # Records the calls made by the generator, so that they can be replayed
+    # against each writer without measuring the generator itself.
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+
+def RecordCalls(targetPlan):
+    depsClosure = DepsClosure(targetPlan)
+    ninja = _RecordingWriter()
+    compilerScope = HandleTgBuild.GenerateCompilerFlagsScope(
+        targetPlan.values(), depsClosure, ninja)
+    for target in targetPlan.values():
+        if isinstance(target, CCTargets.CCLibrary):
+            HandleTgBuild.GenerateCCLibrary(target, depsClosure,
+                                            compilerScope, None, '', ninja)
+        else:
+            HandleTgBuild.GenerateCCBinary(target, depsClosure,
+                                           compilerScope, None, False, '',
+                                           ninja)
+    return ninja.calls
+
+
+def Replay(writerClass, ostream, calls):
+    ninja = writerClass(ostream)
+    for name, args, kwargs in calls:
+        getattr(ninja, name)(*args, **kwargs)
+    if isinstance(ninja, ninja_syntax.FastWriter):
+        ninja.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--targets', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmpDir:
+        srcFs = SrcFs(pathlib.Path(tmpDir))
+        targetPlan = DepsClosureBench.MakeSyntheticPlan(
+            srcFs, args.targets, fanOut=3, window=1000)
+        calls = RecordCalls(targetPlan)
+        outputPath = pathlib.Path(tmpDir) / 'build.ninja'
+        print('{:>12} {:>10} {:>12}'.format('writer', 'time, s', 'bytes'))
+        for writerClass in [ninja_syntax.Writer, ninja_syntax.FastWriter]:
+            samples = []
+            for _ in range(args.repeat):
+                startTime = time.perf_counter()
+                with outputPath.open('w', encoding='utf-8') as ostream:
+                    Replay(writerClass, ostream, calls)
+                samples.append(time.perf_counter() - startTime)
+            print('{:>12} {:>10.3f} {:>12}'.format(
+                writerClass.__name__, min(samples),
+                outputPath.stat().st_size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import ninja_syntax
+
+import io
+import unittest
+
+
+def Generate(ninja):
+    ninja.comment('build.ninja')
+    ninja.variable('cc_flags', ['-O2', '', '-g'])
+    ninja.rule(name='cc', command='$cc $cc_flags -c $in -o $out', deps='gcc')
+    ninja.newline()
+    for i in range(100):
+        ninja.build(
+            outputs='out/file {}.o'.format(i),
+            rule='cc',
+            inputs=['src/file {}.c'.format(i), 'c:/x.c'],
+            implicit=['gen.h'] * (i % 3),
+            order_only=['build.ninja', 'fake_root'],
+            variables={'extra_flags': ' '.join(['-DX'] * i)},
+            implicit_outputs='out/file {}.d'.format(i) if i % 2 else None)
+    ninja.subninja('sub.ninja')
+
+
+def Unwrap(text):
+    # Joins continuation lines the way ninja does.
+    lines = []
+    for line in text.split('\n'):
+        if lines and lines[-1].endswith(' $'):
+            lines[-1] = lines[-1][:-1] + line.lstrip()
+        else:
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+class TestFastWriter(unittest.TestCase):
+    def test_SameManifest(self):
+        expected = io.StringIO()
+        Generate(ninja_syntax.Writer(expected, width=100000))
+        for width in [None, 78]:
+            for batchSize in [1, 7, 1024]:
+                actual = io.StringIO()
+                ninja = ninja_syntax.FastWriter(
+                    actual, width=width, batch_size=batchSize)
+                Generate(ninja)
+                ninja.flush()
+                self.assertEqual(expected.getvalue(),
+                                 Unwrap(actual.getvalue()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+import collections
+import fnmatch
+import os
+import pickle
+
+from Target import kTargetsFile
+
+# Bump whenever the pickled layout of the index changes.
+kFormatVersion = 2
+
+kDefaultIgnoreDirs = ('.git', '.hg', '.svn')
+
+_Entry = collections.namedtuple(
+    '_Entry', ['mtimeNs', 'hasTargets', 'isLocalRoot', 'subdirs'])
+
+
+class PackageIndex:
+    # Index of the directories with TARGETS files.
+    #
+    # For every directory the index keeps its mtime, whether it contains a
+    # TARGETS file, whether it is a local root, i.e. contains one of the
+    # markers of SrcFs, and the list of its subdirectories. Creating or
+    # removing an entry changes the mtime of the directory, so a single stat
+    # per directory is enough to revalidate the index. A directory is
+    # revalidated once until the next Refresh(), so local roots of the
+    # directories listed by ListPackages() cost no stats at all.
+    #
+    # Directories whose names are not valid path tokens cannot hold packages
+    # and are never visited. Additional ignore rules are shell patterns
+    # matched against the name of a directory or, if a pattern contains a
+    # slash, against its path relative to the source root.
+
+    def __init__(self, srcFs, indexPath, ignoreDirs=kDefaultIgnoreDirs):
+        self.__srcFs = srcFs
+        self.__indexPath = indexPath
+        self.__ignoreNames = tuple(
+            pattern for pattern in ignoreDirs if '/' not in pattern)
+        self.__ignorePaths = tuple(
+            pattern.strip('/') for pattern in ignoreDirs if '/' in pattern)
+        self.__localRootMarkers = frozenset(srcFs.GetLocalRootMarkers())
+        self.__entries = None
+        self.__fresh = set()
+        self.__dirty = False
+
+    def Refresh(self, srcFs=None):
+        # Directories may have changed since they were revalidated. A new
+        # srcFs replaces the old one together with its memoized paths.
+        if srcFs is not None:
+            assert frozenset(srcFs.GetLocalRootMarkers(
+            )) == self.__localRootMarkers, 'Local root markers differ.'
+            self.__srcFs = srcFs
+        self.__fresh = set()
+
+    def _GetEntries(self):
+        if self.__entries is None:
+            self.__entries = dict()
+            try:
+                with self.__indexPath.open('rb') as istream:
+                    version, settings, entries = pickle.load(istream)
+                if (version == kFormatVersion and
+                        settings == self._GetSettings() and
+                        isinstance(entries, dict)):
+                    self.__entries = entries
+            except Exception:
+                # A missing or corrupt index is equivalent to an empty one.
+                pass
+        return self.__entries
+
+    def _GetSettings(self):
+        return (self.__ignoreNames, self.__ignorePaths,
+                tuple(sorted(self.__localRootMarkers)))
+
+    def _IsIgnored(self, path, name):
+        if not self.__srcFs.IsName(name):
+            return True
+        if any(fnmatch.fnmatchcase(name, pattern)
+               for pattern in self.__ignoreNames):
+            return True
+        relativePath = path[2:] + '/' + name if path != '/' else name
+        return any(
+            fnmatch.fnmatchcase(relativePath, pattern)
+            for pattern in self.__ignorePaths)
+
+    def _Scan(self, path, mtimeNs):
+        hasTargets = False
+        isLocalRoot = False
+        subdirs = []
+        with os.scandir(str(self.__srcFs.MakeRealPath(path))) as it:
+            for entry in it:
+                if entry.name == kTargetsFile:
+                    hasTargets = entry.is_file()
+                    continue
+                if entry.name in self.__localRootMarkers:
+                    # Markers may be files, e.g. .git of a worktree.
+                    isLocalRoot = True
+                if (entry.is_dir(follow_symlinks=False) and
+                        not self._IsIgnored(path, entry.name)):
+                    subdirs.append(entry.name)
+        return _Entry(
+            mtimeNs=mtimeNs,
+            hasTargets=hasTargets,
+            isLocalRoot=isLocalRoot,
+            subdirs=tuple(subdirs))
+
+    def _Forget(self, path):
+        entries = self._GetEntries()
+        prefix = path + '/'
+        for key in [key for key in entries if key.startswith(prefix)]:
+            del entries[key]
+        entries.pop(path, None)
+
+    def _GetEntry(self, path):
+        entries = self._GetEntries()
+        entry = entries.get(path)
+        if path in self.__fresh:
+            return entry
+        self.__fresh.add(path)
+        try:
+            mtimeNs = os.stat(str(self.__srcFs.MakeRealPath(path)),
+                              follow_symlinks=False).st_mtime_ns
+        except FileNotFoundError:
+            if entry is not None:
+                self._Forget(path)
+                self.__dirty = True
+            return None
+        if entry is not None and entry.mtimeNs == mtimeNs:
+            return entry
+        newEntry = self._Scan(path, mtimeNs)
+        if entry is not None:
+            for subdir in set(entry.subdirs) - set(newEntry.subdirs):
+                self._Forget(self.__srcFs.CombinePaths(path, subdir))
+        entries[path] = newEntry
+        self.__dirty = True
+        return newEntry
+
+    def IsLocalRoot(self, path):
+        assert self.__srcFs.IsAbsolutePath(
+            path), '{}: Absolute path expected.'.format(path)
+        entry = self._GetEntry(path)
+        return entry is not None and entry.isLocalRoot
+
+    def ListPackages(self, path):
+        assert self.__srcFs.IsAbsolutePath(
+            path), '{}: Absolute path expected.'.format(path)
+        result = []
+        stack = [path]
+        while stack:
+            path = stack.pop()
+            entry = self._GetEntry(path)
+            if entry is None:
+                continue
+            if entry.hasTargets:
+                result.append(path)
+            stack.extend(
+                self.__srcFs.CombinePaths(path, subdir)
+                for subdir in entry.subdirs)
+        return sorted(result)
+
+    def Save(self):
+        if not self.__dirty:
+            return
+        self.__indexPath.parent.mkdir(parents=True, exist_ok=True)
+        tmpPath = self.__indexPath.with_name('{}.{}.tmp'.format(
+            self.__indexPath.name, os.getpid()))
+        with tmpPath.open('wb') as ostream:
+            pickle.dump((kFormatVersion, self._GetSettings(), self.__entries),
+                        ostream, pickle.HIGHEST_PROTOCOL)
+        os.replace(str(tmpPath), str(self.__indexPath))
+        self.__dirty = False
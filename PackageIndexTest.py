@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from PackageIndex import PackageIndex
+from SrcFs import SrcFs
+
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+
+class TestPackageIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.tmpDir.name)
+        self.srcFs = SrcFs(self.root)
+        self.indexPath = self.root / '.tg' / 'packages.index'
+        for path in ['a', 'a/b', 'a/b/c', 'd', '.git/x', 'out/e']:
+            self.addPackage(path)
+
+    def tearDown(self):
+        self.tmpDir.cleanup()
+
+    def addPackage(self, path):
+        (self.root / path).mkdir(parents=True, exist_ok=True)
+        (self.root / path / 'TARGETS').write_text('')
+
+    def listPackages(self, path):
+        packageIndex = PackageIndex(
+            self.srcFs, self.indexPath, ignoreDirs=['out/*'])
+        result = packageIndex.ListPackages(path)
+        packageIndex.Save()
+        return result
+
+    def test_ListPackages(self):
+        self.assertEqual(['//a', '//a/b', '//a/b/c', '//d'],
+                         self.listPackages('/'))
+        self.assertEqual(['//a/b', '//a/b/c'], self.listPackages('//a/b'))
+        self.assertEqual([], self.listPackages('//missing'))
+
+    def test_Revalidation(self):
+        self.assertEqual(['//a', '//a/b', '//a/b/c', '//d'],
+                         self.listPackages('/'))
+        self.addPackage('a/b/f')
+        (self.root / 'd' / 'TARGETS').unlink()
+        shutil.rmtree(str(self.root / 'a' / 'b' / 'c'))
+        self.assertEqual(['//a', '//a/b', '//a/b/f'], self.listPackages('/'))
+
+    def test_IsLocalRoot(self):
+        (self.root / 'a' / 'b' / '.git').write_text('gitdir: elsewhere\n')
+        packageIndex = PackageIndex(
+            self.srcFs, self.indexPath, ignoreDirs=['out/*'])
+        self.assertEqual(['//a', '//a/b', '//a/b/c', '//d'],
+                         packageIndex.ListPackages('/'))
+        self.assertTrue(packageIndex.IsLocalRoot('/'))
+        self.assertFalse(packageIndex.IsLocalRoot('//a'))
+        self.assertTrue(packageIndex.IsLocalRoot('//a/b'))
+        self.assertFalse(packageIndex.IsLocalRoot('//missing'))
+        packageIndex.Save()
+        # Revalidated by the mtime of the directory.
+        (self.root / 'a' / '.hg').mkdir()
+        packageIndex = PackageIndex(
+            self.srcFs, self.indexPath, ignoreDirs=['out/*'])
+        self.assertTrue(packageIndex.IsLocalRoot('//a'))
+        # Once per refresh.
+        shutil.rmtree(str(self.root / 'a' / '.hg'))
+        self.assertTrue(packageIndex.IsLocalRoot('//a'))
+        packageIndex.Refresh()
+        self.assertFalse(packageIndex.IsLocalRoot('//a'))
+        # A fresh srcFs replaces the one the index was created with.
+        srcFs = SrcFs(self.root)
+        packageIndex.Refresh(srcFs)
+        srcFs.SetIsLocalRootFn(packageIndex.IsLocalRoot)
+        self.assertEqual('//a/b', srcFs.FindLocalRoot('//a/b/c'))
+        with self.assertRaises(AssertionError):
+            packageIndex.Refresh(SrcFs(self.root, localRootMarkers=('.x', )))
+
+    def test_LocalRootMarkers(self):
+        (self.root / 'd' / 'WORKSPACE').write_text('')
+        srcFs = SrcFs(self.root, localRootMarkers=('.git', 'WORKSPACE'))
+        packageIndex = PackageIndex(srcFs, self.indexPath)
+        srcFs.SetIsLocalRootFn(packageIndex.IsLocalRoot)
+        self.assertEqual('//d', srcFs.FindLocalRoot('//d'))
+        self.assertEqual('/', srcFs.FindLocalRoot('//a/b/c'))
+        self.assertEqual('//d/e', srcFs.CombinePaths('//d', '@/e'))
+        # The same answers without the index.
+        srcFs = SrcFs(self.root, localRootMarkers=('.git', 'WORKSPACE'))
+        self.assertEqual('//d', srcFs.FindLocalRoot('//d'))
+        self.assertEqual('/', srcFs.FindLocalRoot('//a/b/c'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+import collections
+import hashlib
+import os
+import pickle
+
+from Target import Target, kTargetsFile
+
+# Bump whenever the pickled layout of Target or its subclasses changes.
+kFormatVersion = 4
+
+_Entry = collections.namedtuple(
+    '_Entry', ['mtimeNs', 'size', 'digest', 'localRoot', 'targets'])
+
+
+def Digest(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+class PersistentTargetCache:
+    def __init__(self, cachePath):
+        self.__cachePath = cachePath
+        self.__entries = None
+        self.__pending = dict()
+        self.__dirty = False
+
+    def _GetEntries(self):
+        if self.__entries is None:
+            self.__entries = dict()
+            try:
+                with self.__cachePath.open('rb') as istream:
+                    version, entries = pickle.load(istream)
+                if version == kFormatVersion and isinstance(entries, dict):
+                    self.__entries = entries
+            except Exception:
+                # A missing or corrupt cache is equivalent to an empty one.
+                pass
+        return self.__entries
+
+    def Lookup(self, srcFs, path):
+        assert srcFs.IsAbsolutePath(path)
+        realPath = srcFs.MakeRealPath(srcFs.CombinePaths(path, kTargetsFile))
+        stat = realPath.stat()
+        localRoot = srcFs.FindLocalRoot(path)
+        entries = self._GetEntries()
+        entry = entries.get(path)
+        if (entry is not None and entry.localRoot == localRoot and
+                entry.mtimeNs == stat.st_mtime_ns and
+                entry.size == stat.st_size):
+            return entry.targets, None
+        data = realPath.read_bytes()
+        digest = Digest(data)
+        newEntry = _Entry(
+            mtimeNs=stat.st_mtime_ns,
+            size=stat.st_size,
+            digest=digest,
+            localRoot=localRoot,
+            targets=None)
+        if (entry is not None and entry.localRoot == localRoot and
+                entry.digest == digest):
+            entries[path] = newEntry._replace(targets=entry.targets)
+            self.__dirty = True
+            return entry.targets, None
+        self.__pending[path] = newEntry
+        return None, data.decode('utf-8')
+
+    def GetInputStat(self, path):
+        # The stat and the digest of the TARGETS file the targets of the
+        # package were evaluated from.
+        entry = self._GetEntries()[path]
+        return entry.mtimeNs, entry.size, entry.digest
+
+    def Store(self, path, targets):
+        self._GetEntries()[path] = self.__pending.pop(path)._replace(
+            targets=targets)
+        self.__dirty = True
+
+    def LoadTargets(self, srcFs, path):
+        targets, source = self.Lookup(srcFs, path)
+        if targets is None:
+            targets = Target.EvalTargets(srcFs, path, source)
+            self.Store(path, targets)
+        return targets
+
+    def Save(self):
+        if not self.__dirty:
+            return
+        self.__cachePath.parent.mkdir(parents=True, exist_ok=True)
+        tmpPath = self.__cachePath.with_name('{}.{}.tmp'.format(
+            self.__cachePath.name, os.getpid()))
+        with tmpPath.open('wb') as ostream:
+            pickle.dump((kFormatVersion, self.__entries), ostream,
+                        pickle.HIGHEST_PROTOCOL)
+        os.replace(str(tmpPath), str(self.__cachePath))
+        self.__dirty = False
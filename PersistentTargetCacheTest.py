@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import CCTargets
+import PersistentTargetCache
+from SrcFs import SrcFs
+from TargetRef import TargetRef
+
+import os
+import pathlib
+import tempfile
+import unittest
+
+
+class TestPersistentTargetCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.tmpDir.name)
+        (self.root / 'src' / 'a').mkdir(parents=True)
+        self.targetsPath = self.root / 'src' / 'a' / 'TARGETS'
+        self.targetsPath.write_text(
+            "cc_library(name='x', srcs=['x.cc'], deps=[':y'])\n"
+            "cc_library(name='y')\n")
+        self.cachePath = self.root / '.tg' / 'targets.cache'
+        self.srcFs = SrcFs(self.root / 'src')
+
+    def tearDown(self):
+        self.tmpDir.cleanup()
+
+    def load(self):
+        cache = PersistentTargetCache.PersistentTargetCache(self.cachePath)
+        result = cache.LoadTargets(self.srcFs, '//a')
+        cache.Save()
+        return result
+
+    def test_RoundTrip(self):
+        targets = self.load()
+        self.assertTrue(self.cachePath.exists())
+        cached = self.load()
+        self.assertEqual(sorted(targets), sorted(cached))
+        x = cached[TargetRef(path='//a', name='x')]
+        self.assertIsInstance(x, CCTargets.CCLibrary)
+        self.assertEqual(('//a/x.cc', ), x.GetSrcs())
+        self.assertEqual((TargetRef(path='//a', name='y'), ), x.GetDeps())
+
+    def test_HitSkipsEvaluation(self):
+        self.load()
+        stat = self.targetsPath.stat()
+        # Same size and mtime: the cached result must be used as is.
+        self.targetsPath.write_text(
+            "cc_library(name='z', srcs=['x.cc'], deps=[':y'])\n"
+            "cc_library(name='y')\n")
+        os.utime(
+            str(self.targetsPath), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertIn(TargetRef(path='//a', name='x'), self.load())
+
+    def test_StaleEntry(self):
+        self.load()
+        self.targetsPath.write_text("cc_library(name='z')\n")
+        self.assertEqual([TargetRef(path='//a', name='z')],
+                         list(self.load()))
+
+    def test_CorruptCache(self):
+        self.cachePath.parent.mkdir(parents=True)
+        self.cachePath.write_bytes(b'garbage')
+        self.assertEqual(2, len(self.load()))
+
+
+if __name__ == '__main__':
+    unittest.main()
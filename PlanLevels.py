@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+
+class PlanLevels:
+    # Dependency levels of the targets of a plan.
+    #
+    # Targets without dependencies are at level 0, and every other target is
+    # one level above its highest dependency. Targets of the same level (a
+    # wavefront) do not depend on each other, so the widest level bounds the
+    # parallelism of building the plan target by target, and the number of
+    # levels is the length of the longest chain of dependencies. A level of
+    # a single target serializes the build. Computed in one pass over the
+    # plan, which lists every target after its dependencies.
+
+    def __init__(self, targetPlan):
+        self.__levels = dict()
+        self.__parents = dict()
+        self.__wavefronts = []
+        for targetRef, target in targetPlan.items():
+            level = 0
+            parent = None
+            for depRef in target.GetDeps():
+                if self.__levels[depRef] + 1 > level:
+                    level = self.__levels[depRef] + 1
+                    parent = depRef
+            self.__levels[targetRef] = level
+            self.__parents[targetRef] = parent
+            if level == len(self.__wavefronts):
+                self.__wavefronts.append([])
+            self.__wavefronts[level].append(targetRef)
+
+    def GetLevel(self, targetRef):
+        return self.__levels[targetRef]
+
+    def GetWavefronts(self):
+        return self.__wavefronts
+
+    def GetMaxParallelism(self):
+        return max((len(wavefront) for wavefront in self.__wavefronts),
+                   default=0)
+
+    def GetLongestChain(self):
+        # Returns the chain from a target at level 0 to a target at the top.
+        result = []
+        targetRef = self.__wavefronts[-1][0] if self.__wavefronts else None
+        while targetRef is not None:
+            result.append(targetRef)
+            targetRef = self.__parents[targetRef]
+        result.reverse()
+        return result
+
+    def GetBottlenecks(self):
+        # Targets alone in their levels, except the top one: everything above
+        # waits for them.
+        return [
+            wavefront[0] for wavefront in self.__wavefronts[:-1]
+            if len(wavefront) == 1
+        ]
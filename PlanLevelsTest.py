@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import CCTargets
+import DepsClosureBench
+from PlanLevels import PlanLevels
+from SrcFs import SrcFs
+from TargetRef import TargetRef
+
+import collections
+import pathlib
+import tempfile
+import unittest
+
+
+class TestPlanLevels(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.srcFs = SrcFs(pathlib.Path(self.tmpDir.name))
+
+    def tearDown(self):
+        self.tmpDir.cleanup()
+
+    def makePlan(self, deps):
+        result = collections.OrderedDict()
+        for name, targetDeps in deps:
+            target = CCTargets.CCLibrary(
+                self.srcFs, '//a', name, deps=[':' + dep for dep in targetDeps])
+            result[target.GetTargetRef()] = target
+        return result
+
+    def test_Levels(self):
+        planLevels = PlanLevels(
+            self.makePlan([('a', []), ('b', []), ('c', ['a']),
+                           ('d', ['a', 'c']), ('e', ['b'])]))
+        ref = lambda name: TargetRef(path='//a', name=name)
+        self.assertEqual([[ref('a'), ref('b')], [ref('c'), ref('e')],
+                          [ref('d')]], planLevels.GetWavefronts())
+        self.assertEqual(2, planLevels.GetLevel(ref('d')))
+        self.assertEqual(2, planLevels.GetMaxParallelism())
+        self.assertEqual([ref('a'), ref('c'), ref('d')],
+                         planLevels.GetLongestChain())
+        self.assertEqual([], planLevels.GetBottlenecks())
+
+    def test_Bottleneck(self):
+        planLevels = PlanLevels(
+            self.makePlan([('a', []), ('b', ['a']), ('c', ['b']),
+                           ('d', ['b'])]))
+        self.assertEqual([TargetRef(path='//a', name='a'),
+                          TargetRef(path='//a', name='b')],
+                         planLevels.GetBottlenecks())
+
+    def test_Synthetic(self):
+        targetPlan = DepsClosureBench.MakeSyntheticPlan(
+            self.srcFs, targetCount=300, fanOut=3, window=50)
+        planLevels = PlanLevels(targetPlan)
+        for targetRef, target in targetPlan.items():
+            self.assertEqual(
+                max((planLevels.GetLevel(depRef) + 1
+                     for depRef in target.GetDeps()),
+                    default=0), planLevels.GetLevel(targetRef))
+        chain = planLevels.GetLongestChain()
+        self.assertEqual(len(planLevels.GetWavefronts()), len(chain))
+        for targetRef, depRef in zip(chain[1:], chain):
+            self.assertIn(depRef, targetPlan[targetRef].GetDeps())
+
+    def test_Empty(self):
+        planLevels = PlanLevels(collections.OrderedDict())
+        self.assertEqual(0, planLevels.GetMaxParallelism())
+        self.assertEqual([], planLevels.GetLongestChain())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,16 +5,34 @@ import pathlib
 
 _TOKEN = '(?:[0-9A-Za-z_+-][0-9A-Za-z._+-]*)'
 
-_NAME_RE = re.compile('^{TOKEN}$'.format(TOKEN=_TOKEN))
+# Entries marking the root directory of a repository, the local root.
+kDefaultLocalRootMarkers = ('.git', '.hg')
 
-_ABSOLUTE_PATH_RE = re.compile('^/(?:/{TOKEN})*$'.format(TOKEN=_TOKEN))
 
-_LOCAL_PATH_RE = re.compile('^@(?:/{TOKEN})*$'.format(TOKEN=_TOKEN))
+class _LazyRegex:
+    # Compiles the pattern on first use to keep the import of the module cheap.
+    __slots__ = ('_pattern', '_regex')
 
-_RELATIVE_PATH_RE = re.compile(
+    def __init__(self, pattern):
+        self._pattern = pattern
+        self._regex = None
+
+    def search(self, string):
+        if self._regex is None:
+            self._regex = re.compile(self._pattern)
+        return self._regex.search(string)
+
+
+_NAME_RE = _LazyRegex('^{TOKEN}$'.format(TOKEN=_TOKEN))
+
+_ABSOLUTE_PATH_RE = _LazyRegex('^/(?:/{TOKEN})*$'.format(TOKEN=_TOKEN))
+
+_LOCAL_PATH_RE = _LazyRegex('^@(?:/{TOKEN})*$'.format(TOKEN=_TOKEN))
+
+_RELATIVE_PATH_RE = _LazyRegex(
     '^(?:|{TOKEN}(?:/{TOKEN})*)$'.format(TOKEN=_TOKEN))
 
-_PATH_RE = re.compile(
+_PATH_RE = _LazyRegex(
     '^(?:|(?:{TOKEN}|@|/)(?:/{TOKEN})*)$'.format(TOKEN=_TOKEN))
 
 
@@ -57,34 +75,78 @@ def CombinePaths(headPart, *tailParts, findLocalRootFn):
         elif IsRelativePath(part):
             result = result + '/' + part
         else:
-            assert false, '{}: Each trailing path must be a path.'.format(part)
+            assert False, '{}: Each trailing path must be a path.'.format(part)
     return result
 
 
+def _IsMemoized(memo, isFn, string):
+    try:
+        return memo[string]
+    except KeyError:
+        result = memo[string] = isFn(string)
+        return result
+    except TypeError:
+        # Unhashable, so not a string.
+        return False
+
+
 class SrcFs:
-    def __init__(self, srcRoot):
+    # Paths are interned: every distinct string is validated once per kind,
+    # combined paths are memoized by their parts, and equal paths are
+    # returned as one shared object. TARGETS files of a tree repeat the same
+    # names and paths across thousands of targets.
+
+    def __init__(self, srcRoot, localRootMarkers=kDefaultLocalRootMarkers):
         assert isinstance(srcRoot, pathlib.Path)
         self.__srcRoot = srcRoot
+        self.__localRootMarkers = tuple(localRootMarkers)
+        self.__isLocalRootFn = None
         self.__localRootCache = dict()
+        self.__strings = dict()
+        # Combined paths by the absolute path and the trailing part.
+        self.__combined = dict()
+        self.__names = dict()
+        self.__absolutePaths = dict()
+        self.__localPaths = dict()
+        self.__relativePaths = dict()
+        self.__paths = dict()
         assert self.__srcRoot.is_dir()
 
+    def __reduce__(self):
+        # Worker processes start with empty caches instead of copies, and
+        # look for local roots by themselves.
+        return (self.__class__, (self.__srcRoot, self.__localRootMarkers))
+
     def GetRealSrcRoot(self):
         return self.__srcRoot
 
+    def GetLocalRootMarkers(self):
+        return self.__localRootMarkers
+
+    def SetIsLocalRootFn(self, isLocalRootFn):
+        # Lets an index of the tree, which knows the entries of directories,
+        # answer instead of stats of every marker.
+        self.__isLocalRootFn = isLocalRootFn
+        self.__localRootCache = dict()
+        self.__combined = dict()
+
+    def Intern(self, string):
+        return self.__strings.setdefault(string, string)
+
     def IsName(self, string):
-        return IsName(string)
+        return _IsMemoized(self.__names, IsName, string)
 
     def IsAbsolutePath(self, string):
-        return IsAbsolutePath(string)
+        return _IsMemoized(self.__absolutePaths, IsAbsolutePath, string)
 
     def IsLocalPath(self, string):
-        return IsLocalPath(string)
+        return _IsMemoized(self.__localPaths, IsLocalPath, string)
 
     def IsRelativePath(self, string):
-        return IsRelativePath(string)
+        return _IsMemoized(self.__relativePaths, IsRelativePath, string)
 
     def IsPath(self, string):
-        return IsPath(string)
+        return _IsMemoized(self.__paths, IsPath, string)
 
     def _Exists(self, path):
         # assert IsAbsolutePath(path)
@@ -92,7 +154,11 @@ class SrcFs:
 
     def _IsLocalRoot(self, path):
         # assert IsAbsolutePath(path)
-        return (self._Exists(path + '/.git') or self._Exists(path + '/.hg'))
+        if self.__isLocalRootFn is not None:
+            return self.__isLocalRootFn(path)
+        return any(
+            self._Exists(path + '/' + marker)
+            for marker in self.__localRootMarkers)
 
     def _FindLocalRoot(self, path):
         # assert IsAbsolutePath(path)
@@ -107,11 +173,43 @@ class SrcFs:
         return self.__localRootCache[path]
 
     def FindLocalRoot(self, path):
-        assert IsAbsolutePath(path), '{}: Absolute path expected.'.format(path)
+        assert self.IsAbsolutePath(path), '{}: Absolute path expected.'.format(
+            path)
         return self._FindLocalRoot(path)
 
-    def CombinePaths(self, *parts):
-        return CombinePaths(*parts, findLocalRootFn=self._FindLocalRoot)
+    def _CombinePath(self, path, part):
+        # assert IsAbsolutePath(path) and path is interned
+        combined = self.__combined.get(path)
+        if combined is None:
+            combined = self.__combined[path] = dict()
+        result = combined.get(part) if isinstance(part, str) else None
+        if result is not None:
+            return result
+        if not part:
+            return path
+        if self.IsAbsolutePath(part):
+            result = self.Intern(part)
+        elif self.IsLocalPath(part):
+            localRoot = self._FindLocalRoot(path)
+            assert localRoot is not None, (
+                '{}: No local root found from here.'.format(path))
+            result = self.Intern(localRoot + part[1:])
+        else:
+            assert self.IsRelativePath(
+                part), '{}: Each trailing path must be a path.'.format(part)
+            result = self.Intern(path + '/' + part)
+        combined[part] = result
+        return result
+
+    def CombinePaths(self, headPart, *tailParts):
+        # Same as CombinePaths() of the module.
+        assert self.IsAbsolutePath(
+            headPart), '{}: The first part must be an absolute one.'.format(
+                headPart)
+        result = self.Intern(headPart)
+        for part in tailParts:
+            result = self._CombinePath(result, part)
+        return result
 
     def _MakeRealPath(self, path):
         # assert IsAbsolutePath(path)
@@ -120,7 +218,8 @@ class SrcFs:
         return self.__srcRoot / path[2:]
 
     def MakeRealPath(self, path):
-        assert IsAbsolutePath(path), '{}: Absolute path expected.'.format(path)
+        assert self.IsAbsolutePath(path), '{}: Absolute path expected.'.format(
+            path)
         return self._MakeRealPath(path)
 
     def MakePath(self, realPath):
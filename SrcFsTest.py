@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import SrcFs
 
+import pathlib
+import tempfile
 import unittest
 
 
@@ -91,6 +93,57 @@ class TestPath(unittest.TestCase):
                              '/',
                              findLocalRootFn=findLocalRootFn))
 
+    def test_CombinePathsWithInvalidPart(self):
+        with self.assertRaises(AssertionError):
+            SrcFs.CombinePaths('//a', '../b', findLocalRootFn=None)
+
+
+class TestSrcFs(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.tmpDir.name)
+        (self.root / 'a' / 'b' / '.git').mkdir(parents=True)
+        self.srcFs = SrcFs.SrcFs(self.root)
+
+    def tearDown(self):
+        self.tmpDir.cleanup()
+
+    def test_CombinePaths(self):
+        for parts in [('/', ''), ('//a', 'b/c'), ('//a/b/c', '@/d'),
+                      ('//a/b/c', '@'), ('//a', '//e'), ('//a', '', 'b', '@')]:
+            self.assertEqual(
+                SrcFs.CombinePaths(
+                    *parts, findLocalRootFn=self.srcFs.FindLocalRoot),
+                self.srcFs.CombinePaths(*parts))
+            # Again from the memoized parts.
+            self.assertEqual(
+                SrcFs.CombinePaths(
+                    *parts, findLocalRootFn=self.srcFs.FindLocalRoot),
+                self.srcFs.CombinePaths(*parts))
+        with self.assertRaises(AssertionError):
+            self.srcFs.CombinePaths('//a', '../b')
+        with self.assertRaises(AssertionError):
+            self.srcFs.CombinePaths('//a', '@/b')
+        with self.assertRaises(AssertionError):
+            self.srcFs.CombinePaths('a', 'b')
+
+    def test_Interned(self):
+        path = self.srcFs.CombinePaths('//a', 'b')
+        self.assertIs(path, self.srcFs.CombinePaths('//a', ''.join('b')))
+        self.assertIs(path, self.srcFs.CombinePaths('//c', '//a/' + 'b'))
+        self.assertIs(path, self.srcFs.Intern('//a/' + 'b'))
+
+    def test_Is(self):
+        self.assertTrue(self.srcFs.IsName('a'))
+        self.assertTrue(self.srcFs.IsName('a'))
+        self.assertFalse(self.srcFs.IsName('a/b'))
+        self.assertFalse(self.srcFs.IsName(['a']))
+        self.assertFalse(self.srcFs.IsPath(None))
+        self.assertTrue(self.srcFs.IsAbsolutePath('//a'))
+        self.assertTrue(self.srcFs.IsLocalPath('@/a'))
+        self.assertTrue(self.srcFs.IsRelativePath('a/b'))
+        self.assertFalse(self.srcFs.IsRelativePath('//a'))
+
     # def test_read_file(self):
     #     self.assertEqual('# -*- coding: utf-8 -*-',
     #                      utils.read_file('@/targets/utils.py').split('\n')[0])
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Measures the cost of imports needed by each tg command, as reported by
+# `python -X importtime`, and prints one JSON object per command:
+#
+#   ./StartupBench.py [--zipapp=tg.pyz] [--repeat=5]
+
+import argparse
+import json
+import pathlib
+import statistics
+import subprocess
+import sys
+
+kCommands = ('build', 'clean', 'server')
+
+
+def MeasureImports(code, sysPath):
+    # Returns the cumulative import time in microseconds of each top-level
+    # module imported by the code beyond the interpreter startup.
+    baseline = set(_ParseImportTime(_RunImportTime('pass', sysPath)))
+    result = dict()
+    for name, cumulativeUs in _ParseImportTime(
+            _RunImportTime(code, sysPath)).items():
+        if name not in baseline:
+            result[name] = cumulativeUs
+    return result
+
+
+def _RunImportTime(code, sysPath):
+    return subprocess.run(
+        [
+            sys.executable, '-X', 'importtime', '-c',
+            'import sys; sys.path.insert(0, {!r}); {}'.format(sysPath, code)
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        check=True,
+        encoding='utf-8').stderr
+
+
+def _ParseImportTime(output):
+    result = dict()
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        # Only top-level imports: nested ones are included in the cumulative
+        # time of their parent.
+        if name.startswith(' ') and not name.startswith('  '):
+            result[name.strip()] = int(fields[1])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--zipapp')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    sysPath = str(
+        pathlib.Path(args.zipapp).resolve() if args.zipapp else pathlib.Path(
+            __file__).resolve().parent)
+    for command in kCommands:
+        code = 'import main; main.LoadCommand({!r})'.format(command)
+        samples = [
+            MeasureImports(code, sysPath) for _ in range(args.repeat)
+        ]
+        totals = [sum(sample.values()) for sample in samples]
+        print(
+            json.dumps({
+                'command': command,
+                'import_us': int(statistics.median(totals)),
+                'modules': sorted(samples[-1], key=samples[-1].get,
+                                  reverse=True),
+            }))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,8 +2,6 @@
 
 from TargetRef import TargetRef
 
-import collections
-
 kTargetsFile = 'TARGETS'
 
 
@@ -11,7 +9,8 @@ class Target:
     def __init__(self, srcFs, path, name, deps):
         assert srcFs.IsAbsolutePath(path)
         assert srcFs.IsName(name)
-        self.__targetRef = TargetRef(path=path, name=name)
+        self.__targetRef = TargetRef(
+            path=srcFs.Intern(path), name=srcFs.Intern(name))
         normalizedDeps = set()
         for dep in deps:
             depTokens = dep.rsplit(':')
@@ -21,7 +20,7 @@ class Target:
             normalizedDeps.add(
                 TargetRef(
                     path=srcFs.CombinePaths(path, depTokens[0]),
-                    name=depTokens[1]))
+                    name=srcFs.Intern(depTokens[1])))
         self.__deps = tuple(sorted(normalizedDeps))
 
     def GetTargetRef(self):
@@ -32,6 +31,13 @@ class Target:
 
     @classmethod
     def LoadTargets(clazz, srcFs, path):
+        assert srcFs.IsAbsolutePath(path)
+        return clazz.EvalTargets(
+            srcFs, path,
+            srcFs.ReadText(srcFs.CombinePaths(path, kTargetsFile)))
+
+    @classmethod
+    def EvalTargets(clazz, srcFs, path, source):
         assert srcFs.IsAbsolutePath(path)
         publicGlobals = dict()
         targets = []
@@ -51,7 +57,7 @@ class Target:
         targetsPath = srcFs.CombinePaths(path, kTargetsFile)
         exec(
             compile(
-                srcFs.ReadText(targetsPath),
+                source,
                 str(srcFs.MakeRealPath(targetsPath)), 'exec'), publicGlobals,
             {})
 
@@ -62,56 +68,3 @@ class Target:
                 target.GetTargetRef())
             result[target.GetTargetRef()] = target
         return result
-
-    @classmethod
-    def LoadTargetPlan(clazz, srcFs, targetRefs):
-        result = collections.OrderedDict()
-
-        class MissingTarget(Exception):
-            def __init__(self, missingTargetRef):
-                self.missingTargetRef = missingTargetRef
-
-        class CirtularDependency(Exception):
-            def __init__(self, parentTargetRef, childTargetRef):
-                self.parentTargetRef = parentTargetRef
-                self.childTargetRef = childTargetRef
-
-        loadedTargetPaths = set()
-        targetDict = dict()
-
-        def getTarget(targetRef):
-            if targetRef.path not in loadedTargetPaths:
-                loadedTargetPaths.add(targetRef.path)
-                targetDict.update(Target.LoadTargets(srcFs, targetRef.path))
-            target = targetDict.get(targetRef)
-            if target:
-                return target
-            raise MissingTarget(targetRef)
-
-        inProgressSet = set()
-        visitedSet = set()
-
-        def dfs(targetRef):
-            target = getTarget(targetRef)
-            inProgressSet.add(targetRef)
-            for depRef in target.GetDeps():
-                if depRef in inProgressSet:
-                    raise CirtularDependency(targetRef)
-                if depRef in visitedSet:
-                    continue
-                visitedSet.add(depRef)
-                dfs(depRef)
-            inProgressSet.remove(targetRef)
-            result[targetRef] = target
-
-        try:
-            for targetRef in targetRefs:
-                dfs(targetRef)
-        except MissingTarget as ex:
-            raise AssertError(
-                '{}: Target not found.'.format(ex.missingTargetRef))
-        except CirtularDependency as ex:
-            raise AssertError(
-                '{PARENT} -> ... -> {CHILD} -> {PARENT}: Circular dependency.'.
-                format(PARENT=ex.parentTargetRef, CHILD=ex.childTargetRef))
-        return result
@@ -1,22 +1,70 @@
 # -*- coding: utf-8 -*-
 
 import collections
-from Target import Target
+import importlib
+import os
+import time
+from Target import Target, kTargetsFile
+from TgTrace import AddSpan, IsTracing, Span
+
+# Below this number of pending TARGETS files starting worker processes costs
+# more than evaluating them in place.
+kParallelLoadThreshold = 8
+
+
+def _ListTargetModules(clazz=Target):
+    result = set()
+    for subclazz in clazz.__subclasses__():
+        result.add(subclazz.__module__)
+        result.update(_ListTargetModules(subclazz))
+    return result
+
+
+def _InitLoadWorker(moduleNames):
+    # Make sure that every target class is registered in the worker, even if
+    # it was spawned rather than forked.
+    for moduleName in moduleNames:
+        importlib.import_module(moduleName)
+
+
+def _EvalTargets(srcFs, path, source):
+    return Target.EvalTargets(srcFs, path, source)
+
+
+def _EvalTargetsTimed(srcFs, path, source):
+    # Worker processes cannot record spans, so they report the times.
+    startNs = time.monotonic_ns()
+    targets = Target.EvalTargets(srcFs, path, source)
+    return targets, startNs, time.monotonic_ns(), os.getpid()
 
 
 class TargetCache:
-    def __init__(self, srcFs):
+    def __init__(self, srcFs, persistentCache=None, jobs=None):
         self.__srcFs = srcFs
+        self.__persistentCache = persistentCache
+        self.__jobs = jobs or os.cpu_count() or 1
         self.__loadedPaths = dict()
+        self.__failedPaths = dict()
 
     def GetSrcFs(self):
         return self.__srcFs
 
     def GetTargets(self, path):
+        # Loaded paths have been validated already.
+        result = self.__loadedPaths.get(path)
+        if result is not None:
+            return result
         assert self.__srcFs.IsAbsolutePath(
             path), '{}: Absolute path expected.'.format(path)
+        if path in self.__failedPaths:
+            raise self.__failedPaths.pop(path)
         if path not in self.__loadedPaths:
-            self.__loadedPaths[path] = Target.LoadTargets(self.__srcFs, path)
+            targets, source = self._Lookup(path)
+            if targets is None:
+                self._Store(path,
+                            Target.EvalTargets(self.__srcFs, path, source))
+            else:
+                self.__loadedPaths[path] = targets
         return self.__loadedPaths[path]
 
     def GetTarget(self, targetRef):
@@ -24,25 +72,140 @@ class TargetCache:
         assert result, '{}: Missing target.'.format(targetRef)
         return result
 
+    def _Lookup(self, path):
+        try:
+            if self.__persistentCache is None:
+                return None, self.__srcFs.ReadText(
+                    self.__srcFs.CombinePaths(path, kTargetsFile))
+            return self.__persistentCache.Lookup(self.__srcFs, path)
+        except FileNotFoundError:
+            assert False, '{}: Missing package.'.format(path)
+
+    def _Store(self, path, targets):
+        if self.__persistentCache is not None:
+            self.__persistentCache.Store(path, targets)
+        self.__loadedPaths[path] = targets
+
+    def LoadPaths(self, paths):
+        # Loads the given packages, evaluating the TARGETS files that are not
+        # cached in worker processes. Errors are deferred until the failed
+        # path is requested through GetTargets(), so diagnostics come in the
+        # same order as with sequential loading.
+        pending = []
+        with Span('LookupTargets') as span:
+            cached = 0
+            for path in sorted(paths):
+                if path in self.__loadedPaths or path in self.__failedPaths:
+                    continue
+                assert self.__srcFs.IsAbsolutePath(
+                    path), '{}: Absolute path expected.'.format(path)
+                try:
+                    targets, source = self._Lookup(path)
+                except Exception as ex:
+                    self.__failedPaths[path] = ex
+                    continue
+                if targets is not None:
+                    self.__loadedPaths[path] = targets
+                    cached += 1
+                else:
+                    pending.append((path, source))
+            span.Set(cached=cached, pending=len(pending))
+        if self.__jobs < 2 or len(pending) < kParallelLoadThreshold:
+            for path, source in pending:
+                with Span('EvalTargets', path=path) as span:
+                    try:
+                        targets = _EvalTargets(self.__srcFs, path, source)
+                        self._Store(path, targets)
+                        span.Set(targets=len(targets))
+                    except Exception as ex:
+                        self.__failedPaths[path] = ex
+            return
+        # Imported here since it is slow to import and rarely needed.
+        import concurrent.futures
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=min(self.__jobs, len(pending)),
+                initializer=_InitLoadWorker,
+                initargs=(sorted(_ListTargetModules()), )) as executor:
+            tracing = IsTracing()
+            futures = [(path, executor.submit(
+                _EvalTargetsTimed if tracing else _EvalTargets,
+                self.__srcFs, path, source)) for path, source in pending]
+            for path, future in futures:
+                try:
+                    if tracing:
+                        targets, startNs, endNs, pid = future.result()
+                        AddSpan('EvalTargets', startNs, endNs, pid, {
+                            'path': path,
+                            'targets': len(targets)
+                        })
+                    else:
+                        targets = future.result()
+                    self._Store(path, targets)
+                except Exception as ex:
+                    self.__failedPaths[path] = ex
+
+    def _LoadTargetClosure(self, targetRefs):
+        visited = set(targetRefs)
+        frontier = list(targetRefs)
+        while frontier:
+            # Deep chains within loaded packages take many steps.
+            paths = set(targetRef.path for targetRef in frontier
+                        if targetRef.path not in self.__loadedPaths)
+            if paths:
+                self.LoadPaths(paths)
+            nextFrontier = []
+            for targetRef in frontier:
+                targets = self.__loadedPaths.get(targetRef.path)
+                target = targets.get(targetRef) if targets else None
+                if target is None:
+                    continue
+                for depRef in target.GetDeps():
+                    if depRef not in visited:
+                        visited.add(depRef)
+                        nextFrontier.append(depRef)
+            frontier = nextFrontier
+
+    def Save(self):
+        if self.__persistentCache is not None:
+            self.__persistentCache.Save()
+
     def MakeTargetPlan(self, targetRefs):
+        # Returns the targets with their transitive dependencies, every
+        # target after its dependencies. The depth-first search keeps its
+        # path on an explicit stack, so that deep chains do not hit the
+        # recursion limit and cycles are reported in full.
+        self._LoadTargetClosure(targetRefs)
         result = collections.OrderedDict()
-        stack = list(targetRefs)
         visited = set()
-        charged = set()
-        while stack:
-            targetRef = stack.pop()
-            target = self.GetTarget(targetRef)
-            if targetRef in charged:
-                charged.remove(targetRef)
-                result[targetRef] = target
-                continue
-            if targetRef in visited:
+        path = []
+        onPath = set()
+        # The targets on the path and iterators over their dependencies.
+        stack = []
+        for rootRef in reversed(list(targetRefs)):
+            if rootRef in visited:
                 continue
-            visited.add(targetRef)
-            charged.add(targetRef)
-            stack.append(targetRef)
-            for depRef in target.GetDeps():
-                assert depRef not in charged, '{PARENT} -> ... -> {CHILD} -> {PARENT}: Circular dependency.'.format(
-                    PARENT=depRef, CHILD=targetRef)
-                stack.append(depRef)
+            visited.add(rootRef)
+            path.append(rootRef)
+            onPath.add(rootRef)
+            target = self.GetTarget(rootRef)
+            stack.append((target, iter(reversed(target.GetDeps()))))
+            while stack:
+                depRef = next(stack[-1][1], None)
+                if depRef is None:
+                    target, _ = stack.pop()
+                    targetRef = path.pop()
+                    onPath.remove(targetRef)
+                    result[targetRef] = target
+                    continue
+                if depRef in onPath:
+                    cycle = path[path.index(depRef):] + [depRef]
+                    assert False, '{}: Circular dependency.'.format(
+                        ' -> '.join(str(targetRef) for targetRef in cycle))
+                if depRef in visited:
+                    continue
+                visited.add(depRef)
+                path.append(depRef)
+                onPath.add(depRef)
+                target = self.GetTarget(depRef)
+                stack.append((target, iter(reversed(target.GetDeps()))))
         return result
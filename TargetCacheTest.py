@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import CCTargets
+import TargetCache
+from SrcFs import SrcFs
+from TargetRef import TargetRef
+
+import pathlib
+import tempfile
+import unittest
+
+
+class TestTargetCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.tmpDir.name)
+        self.srcFs = SrcFs(self.root)
+        self.threshold = TargetCache.kParallelLoadThreshold
+        TargetCache.kParallelLoadThreshold = 2
+
+    def tearDown(self):
+        TargetCache.kParallelLoadThreshold = self.threshold
+        self.tmpDir.cleanup()
+
+    def writeTargets(self, path, text):
+        (self.root / path).mkdir(parents=True, exist_ok=True)
+        (self.root / path / 'TARGETS').write_text(text)
+
+    def makePlan(self, jobs, targetRefs):
+        return TargetCache.TargetCache(
+            self.srcFs, jobs=jobs).MakeTargetPlan(targetRefs)
+
+    def test_ParallelPlan(self):
+        for i in range(20):
+            self.writeTargets('p{}'.format(i), "cc_library(name='t', deps=[{}])".format(
+                ', '.join("'//p{}:t'".format(j) for j in range(i % 7, i))))
+        targetRefs = [TargetRef(path='//p19', name='t')]
+        self.assertEqual(
+            list(self.makePlan(1, targetRefs)),
+            list(self.makePlan(4, targetRefs)))
+
+    def test_DeferredError(self):
+        self.writeTargets('a', "cc_library(name='t', deps=['//b:t', '//c:t'])")
+        self.writeTargets('b', "cc_library(name='t')")
+        self.writeTargets('c', "cc_library(name='t', srcs=['..'])")
+        targetCache = TargetCache.TargetCache(self.srcFs, jobs=4)
+        targetCache.LoadPaths(['//a', '//b', '//c'])
+        self.assertEqual([TargetRef(path='//b', name='t')],
+                         list(targetCache.GetTargets('//b')))
+        with self.assertRaisesRegex(AssertionError, 'Invalid src'):
+            targetCache.GetTargets('//c')
+
+    def test_MissingPackage(self):
+        self.writeTargets('a', "cc_library(name='t', deps=['//b:t'])")
+        with self.assertRaisesRegex(AssertionError,
+                                    '^//b: Missing package.$'):
+            self.makePlan(1, [TargetRef(path='//a', name='t')])
+
+    def test_CircularDependency(self):
+        self.writeTargets('a', "cc_library(name='t', deps=['//b:t'])")
+        self.writeTargets('b', "cc_library(name='t', deps=['//a:t'])")
+        with self.assertRaisesRegex(AssertionError, 'Circular dependency'):
+            self.makePlan(4, [TargetRef(path='//a', name='t')])
+
+    def test_CircularDependencyPath(self):
+        self.writeTargets('a', "cc_library(name='t', deps=['//b:t'])")
+        self.writeTargets('b', "cc_library(name='t', deps=['//c:t'])")
+        self.writeTargets('c', "cc_library(name='t', deps=['//b:t'])")
+        with self.assertRaisesRegex(
+                AssertionError,
+                '^//b:t -> //c:t -> //b:t: Circular dependency.$'):
+            self.makePlan(1, [TargetRef(path='//a', name='t')])
+
+    def test_DeepChain(self):
+        # Deeper than the recursion limit.
+        self.writeTargets('a', ''.join(
+            "cc_library(name='t{}', deps=[':t{}'])\n".format(i, i - 1)
+            for i in range(1, 5000)) + "cc_library(name='t0')\n")
+        targetPlan = self.makePlan(1, [TargetRef(path='//a', name='t4999')])
+        self.assertEqual(
+            [TargetRef(path='//a', name='t{}'.format(i)) for i in range(5000)],
+            list(targetPlan))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+# Optional settings of a Tg environment. They are read from the `.tgroot` file
+# in the root of the environment, which is evaluated as Python code:
+#
+#   ignore_dirs = ['third_party/huge', 'node_modules']
+#   local_root_markers = ['.jj', 'WORKSPACE']
+#   compile_cache = True
+#   compile_cache_dir = '/var/cache/tg'
+#   compile_cache_size = 10 * 1024**3
+#   link_pool_depth = 2
+#   heavy_compile_pool_depth = 4
+#   link_objects = True
+#   configs = {'debug': {'compiler_flags': ['-O0', '-UNDEBUG']}}
+
+kConfigFile = '.tgroot'
+
+
+class TgConfig:
+    def __init__(self, values=None):
+        self.__values = dict(values or ())
+
+    def Get(self, name, default=None):
+        return self.__values.get(name, default)
+
+    def GetBool(self, name, default=False):
+        result = self.__values.get(name, default)
+        assert isinstance(result, bool), '{}: {}: Boolean expected.'.format(
+            kConfigFile, name)
+        return result
+
+    def GetInt(self, name, default=0):
+        result = self.__values.get(name, default)
+        assert isinstance(result, int) and not isinstance(
+            result, bool), '{}: {}: Integer expected.'.format(kConfigFile, name)
+        return result
+
+    def GetString(self, name, default=''):
+        result = self.__values.get(name, default)
+        assert isinstance(result, str), '{}: {}: String expected.'.format(
+            kConfigFile, name)
+        return result
+
+    def GetStringList(self, name, default=tuple()):
+        result = self.__values.get(name, default)
+        assert isinstance(result, (list, tuple)) and all(
+            isinstance(item, str) and item
+            for item in result), '{}: {}: List of strings expected.'.format(
+                kConfigFile, name)
+        return tuple(result)
+
+    @classmethod
+    def Load(clazz, tgPath):
+        configPath = tgPath / kConfigFile
+        publicGlobals = dict()
+        if configPath.is_file():
+            exec(
+                compile(
+                    configPath.read_text(encoding='utf-8'),
+                    str(configPath), 'exec'), publicGlobals)
+        return clazz({
+            name: value
+            for name, value in publicGlobals.items()
+            if not name.startswith('_')
+        })
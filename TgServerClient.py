@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+# Client side of `tg server`. It is imported on every `tg build`, so it must
+# stay cheap to import.
+
+import json
+import os
+import socket
+import struct
+import sys
+
+kServerSocketFile = '.tg/server.sock'
+
+# Disables forwarding to the server. It is also set for the processes started
+# by the server, so that `tg build --ninja-training` invoked by ninja does not
+# wait for the server that runs it.
+kEnvNoServer = 'TG_NO_SERVER'
+
+# Each message sent by the server is a frame: kind (1 byte), length of the
+# payload (4 bytes, big endian) and the payload.
+kFrameStdout = b'o'
+kFrameStderr = b'e'
+kFrameExit = b'x'
+kFrameHeader = struct.Struct('>cI')
+
+
+def SendFrame(connection, kind, payload):
+    connection.sendall(kFrameHeader.pack(kind, len(payload)) + payload)
+
+
+def RecvExactly(connection, size):
+    result = b''
+    while len(result) < size:
+        chunk = connection.recv(size - len(result))
+        if not chunk:
+            raise ConnectionError('tg server: Connection closed.')
+        result += chunk
+    return result
+
+
+def Connect(tgPath):
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(str(tgPath / kServerSocketFile))
+    except OSError:
+        connection.close()
+        return None
+    return connection
+
+
+def ForwardToTgServer(tgPath, command, args):
+    # Returns the exit code of the command executed by the server, or None if
+    # no server is running for the environment.
+    if os.getenv(kEnvNoServer) or not (tgPath / kServerSocketFile).exists():
+        return None
+    connection = Connect(tgPath)
+    if connection is None:
+        return None
+    with connection:
+        connection.sendall(
+            json.dumps({
+                'command': command,
+                'args': args,
+                'cwd': os.getcwd(),
+                'env': dict(os.environ),
+            }).encode('utf-8') + b'\n')
+        while True:
+            kind, size = kFrameHeader.unpack(
+                RecvExactly(connection, kFrameHeader.size))
+            payload = RecvExactly(connection, size)
+            if kind == kFrameExit:
+                return int(payload)
+            ostream = sys.stderr if kind == kFrameStderr else sys.stdout
+            ostream.buffer.write(payload)
+            ostream.flush()
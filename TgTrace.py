@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+# Tracing of tg's own work. While a trace is active, the phases of a command
+# record spans with their durations and counts, which can be saved as Chrome
+# trace events (chrome://tracing, Perfetto) or summarized per phase:
+#
+#   with Span('MakeTargetPlan') as span:
+#       ...
+#       span.Set(targets=len(targetPlan))
+#
+# Without an active trace Span() returns a shared object that does nothing.
+# Timestamps come from the monotonic clock, which is common to the worker
+# processes of tg on the same host.
+
+import collections
+import json
+import os
+import time
+
+_tracer = None
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def Set(self, **counts):
+        pass
+
+
+_kNullSpan = _NullSpan()
+
+
+class _Span:
+    def __init__(self, tracer, name, counts):
+        self.__tracer = tracer
+        self.__name = name
+        self.__counts = counts
+        self.__startNs = None
+
+    def __enter__(self):
+        self.__startNs = time.monotonic_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.__tracer.AddSpan(self.__name, self.__startNs,
+                              time.monotonic_ns(), os.getpid(),
+                              self.__counts)
+        return False
+
+    def Set(self, **counts):
+        self.__counts.update(counts)
+
+
+class Tracer:
+    def __init__(self):
+        self.__spans = []
+
+    def AddSpan(self, name, startNs, endNs, pid, counts):
+        self.__spans.append((name, startNs, endNs, pid, counts))
+
+    def MakeChromeTrace(self):
+        originNs = min((span[1] for span in self.__spans), default=0)
+        return {
+            'traceEvents': [{
+                'name': name,
+                'cat': 'tg',
+                'ph': 'X',
+                'ts': (startNs - originNs) / 1000.0,
+                'dur': (endNs - startNs) / 1000.0,
+                'pid': pid,
+                'tid': pid,
+                'args': counts,
+            } for name, startNs, endNs, pid, counts in self.__spans],
+            'displayTimeUnit':
+            'ms',
+        }
+
+    def FormatStats(self):
+        # Calls, total time and summed counts per phase, in the order the
+        # phases first finished.
+        calls = collections.OrderedDict()
+        totalNs = collections.defaultdict(int)
+        counts = collections.defaultdict(collections.Counter)
+        for name, startNs, endNs, _, spanCounts in self.__spans:
+            calls[name] = calls.get(name, 0) + 1
+            totalNs[name] += endNs - startNs
+            for key, value in spanCounts.items():
+                # Other arguments, like paths, do not add up.
+                if isinstance(value, int):
+                    counts[name][key] += value
+        result = 'tg: {:<24} {:>7} {:>9}\n'.format('phase', 'calls', 'time')
+        for name, callCount in calls.items():
+            result += 'tg: {:<24} {:>7} {:>8.3f}s {}\n'.format(
+                name, callCount, totalNs[name] / 1e9, ' '.join(
+                    '{}={}'.format(key, value)
+                    for key, value in sorted(counts[name].items())))
+        return result
+
+    def Save(self, path):
+        with open(path, 'w', encoding='utf-8') as ostream:
+            json.dump(self.MakeChromeTrace(), ostream)
+
+
+def StartTrace():
+    global _tracer
+    assert _tracer is None, 'A trace is already active.'
+    _tracer = Tracer()
+
+
+def StopTrace():
+    global _tracer
+    result, _tracer = _tracer, None
+    return result
+
+
+def IsTracing():
+    return _tracer is not None
+
+
+def Span(name, **counts):
+    if _tracer is None:
+        return _kNullSpan
+    return _Span(_tracer, name, counts)
+
+
+def AddSpan(name, startNs, endNs, pid, counts):
+    # For spans measured elsewhere, e.g. in worker processes.
+    if _tracer is not None:
+        _tracer.AddSpan(name, startNs, endNs, pid, counts)
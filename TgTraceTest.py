@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from TgTrace import IsTracing, Span, StartTrace, StopTrace
+
+import unittest
+
+
+class TestTgTrace(unittest.TestCase):
+    def test_Disabled(self):
+        self.assertFalse(IsTracing())
+        with Span('phase', path='//a') as span:
+            span.Set(targets=1)
+        self.assertIsNone(StopTrace())
+
+    def test_Spans(self):
+        StartTrace()
+        try:
+            with Span('outer'):
+                for path in ['//a', '//b']:
+                    with Span('inner', path=path) as span:
+                        span.Set(targets=2, written=True)
+        finally:
+            tracer = StopTrace()
+        self.assertFalse(IsTracing())
+        events = tracer.MakeChromeTrace()['traceEvents']
+        self.assertEqual(['inner', 'inner', 'outer'],
+                         [event['name'] for event in events])
+        self.assertEqual({'path': '//b', 'targets': 2, 'written': True},
+                         events[1]['args'])
+        outer = events[2]
+        for event in events[:2]:
+            self.assertLessEqual(outer['ts'], event['ts'])
+            self.assertLessEqual(event['ts'] + event['dur'],
+                                 outer['ts'] + outer['dur'])
+        stats = tracer.FormatStats().splitlines()
+        self.assertEqual(3, len(stats))
+        self.assertIn('targets=4 written=2', stats[1])
+        self.assertEqual(['outer', '1'], stats[2].split()[1:3])
+
+
+if __name__ == '__main__':
+    unittest.main()
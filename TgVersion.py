@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+
+# Part of the fingerprint of build.ninja: changing it makes every environment
+# regenerate its build.ninja on the next build.
+kTgVersion = '0.8'
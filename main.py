@@ -4,10 +4,6 @@
 import os
 import sys
 import pathlib
-import CCTargets
-
-from HandleTgBuild import HandleTgBuild
-from HandleTgClean import HandleTgClean
 
 
 def ShowGeneralHelp():
@@ -20,10 +16,29 @@ def ShowGeneralHelp():
           "The commands are:\n"
           "\n"
           "        build       compile targets and dependencies\n"
-          "        clean       remove compiled artifacts\n"
+          "        clean       remove compiled artifacts and forget the\n"
+          "                    targets of previous builds\n"
+          "        profile     report where the time of the last build went\n"
+          "        server      run|start|stop a server that keeps targets\n"
+          "                    loaded between builds\n"
           "\n"
           "Environment variables:\n"
           "        TGPATH      path to the root of Tg environment\n"
+          "        TG_NO_SERVER  do not forward commands to the server\n"
+          "        TG_LINK_POOL_DEPTH, TG_HEAVY_COMPILE_POOL_DEPTH\n"
+          "                    number of links and of heavy_compile targets'\n"
+          "                    compilations running at once\n"
+          "        TG_TRACE    write Chrome trace events of tg's own work to\n"
+          "                    the file, same as tg build --trace=FILE\n"
+          "\n"
+          "Files:\n"
+          "        .tgroot     marks the root of Tg environment; may define\n"
+          "                    settings, e.g. ignore_dirs = ['third_party']\n"
+          "                    or compile_cache = True\n"
+          "                    and build configurations for\n"
+          "                    tg build --config=NAME, e.g.\n"
+          "                    configs = {\n"
+          "                        'debug': {'compiler_flags': ['-O0']}}\n"
           "\n")
     sys.exit(-1)
 
@@ -41,17 +56,38 @@ def FindTgPath():
     raise RuntimeError('Unable to detect the root directory. Please create '
                        '`.tgroot` file or use TGPATH environment variable.')
 
+def LoadCommand(command):
+    # Handlers are imported on demand, so that each command pays only for the
+    # modules it needs.
+    if command == 'build':
+        from HandleTgBuild import HandleTgBuild
+        return HandleTgBuild
+    if command == 'clean':
+        from HandleTgClean import HandleTgClean
+        return HandleTgClean
+    if command == 'profile':
+        from HandleTgProfile import HandleTgProfile
+        return HandleTgProfile
+    if command == 'server':
+        from HandleTgServer import HandleTgServer
+        return HandleTgServer
+    if command == 'compile-cache':
+        from CompileCache import HandleTgCompileCache
+        return HandleTgCompileCache
+    assert False, '{}: Unknown command.'.format(command)
+
+
 def main():
     if (len(sys.argv) == 1 or 'help' in sys.argv or '-h' in sys.argv or
             '--help' in sys.argv):
         ShowGeneralHelp()
     tgPath = FindTgPath()
-    if sys.argv[1] == 'build':
-        HandleTgBuild(tgPath, sys.argv[2:])
-    elif sys.argv[1] == 'clean':
-        HandleTgClean(tgPath, sys.argv[2:])
-    else:
-        assert False, '{}: Unknown command.'.format(sys.argv[1])
+    if sys.argv[1] in ('build', 'clean'):
+        from TgServerClient import ForwardToTgServer
+        exitCode = ForwardToTgServer(tgPath, sys.argv[1], sys.argv[2:])
+        if exitCode is not None:
+            sys.exit(exitCode)
+    LoadCommand(sys.argv[1])(tgPath, sys.argv[2:])
 
 
 if __name__ == '__main__':
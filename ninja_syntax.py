@@ -170,6 +170,97 @@ class Writer(object):
         self.output.close()
 
 
+class FastWriter(Writer):
+    """A Writer for large manifests.
+
+    Lines are wrapped only past `width` (no wrapping by default), escaped
+    paths are cached since the same paths tend to repeat across edges, and
+    lines are written to the output in batches. Call flush() or close()
+    when done. The number of written build edges is kept in `edge_count`."""
+
+    def __init__(self, output, width=None, batch_size=1024):
+        super(FastWriter, self).__init__(output, width)
+        self.batch_size = batch_size
+        self._lines = []
+        self._escaped_paths = {}
+        self.edge_count = 0
+
+    def _escape_path(self, word):
+        result = self._escaped_paths.get(word)
+        if result is None:
+            result = self._escaped_paths[word] = escape_path(word)
+        return result
+
+    def newline(self):
+        self._write('\n')
+
+    def comment(self, text, has_path=False):
+        if self.width is None:
+            self._write('# ' + text + '\n')
+        else:
+            self.flush()
+            super(FastWriter, self).comment(text, has_path)
+
+    def build(self,
+              outputs,
+              rule,
+              inputs=None,
+              implicit=None,
+              order_only=None,
+              variables=None,
+              implicit_outputs=None):
+        outputs = as_list(outputs)
+        escape = self._escape_path
+        self.edge_count += 1
+        line = ['build']
+        line.extend(escape(x) for x in outputs)
+        if implicit_outputs:
+            line.append('|')
+            line.extend(escape(x) for x in as_list(implicit_outputs))
+        line[-1] += ':'
+        line.append(rule)
+        line.extend(escape(x) for x in as_list(inputs))
+        if implicit:
+            line.append('|')
+            line.extend(escape(x) for x in as_list(implicit))
+        if order_only:
+            line.append('||')
+            line.extend(escape(x) for x in as_list(order_only))
+        self._line(' '.join(line))
+
+        if variables:
+            if isinstance(variables, dict):
+                iterator = iter(variables.items())
+            else:
+                iterator = iter(variables)
+
+            for key, val in iterator:
+                self.variable(key, val, indent=1)
+
+        return outputs
+
+    def _line(self, text, indent=0):
+        if self.width is None or 2 * indent + len(text) <= self.width:
+            self._write('  ' * indent + text + '\n')
+        else:
+            self.flush()
+            super(FastWriter, self)._line(text, indent)
+
+    def _write(self, text):
+        self._lines.append(text)
+        if len(self._lines) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._lines:
+            self.output.write(''.join(self._lines))
+            self._lines = []
+
+    def close(self):
+        self.flush()
+        super(FastWriter, self).close()
+
+
 def as_list(input):
     if input is None:
         return []